@@ -0,0 +1,245 @@
+"""
+Times & memory-profiles every stage of dcf_calcs.py on synthetic financials (no api key or internet needed)
+
+Per-company stages run the functions the way the notebook/value_universe() does (one call per ticker),
+batch stages run the universe-wide array/panel versions.
+
+Usage:
+    python benchmarks/bench_dcf_stages.py                      # 1, 100 & 10,000 tickers
+    python benchmarks/bench_dcf_stages.py --sizes 1 100 --years 10 --json bench_output.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+from dcf_calcs import (
+    calculate_historical_free_cash_flows,
+    calculate_average_net_income_growth_equity_earnings_method,
+    calculate_ratio_of_FCF_components_to_revenue,
+    forecast_fcf,
+    forecast_fcf_matrix,
+    calculate_interest_coverage_ratio_and_synthetic_rating,
+    calculate_company_expected_return_CAPM,
+    calculate_expected_returns_CAPM,
+    calculate_WACC,
+    calculate_terminal_enterprise_equity_values,
+    calculate_equity_values_array,
+    build_financials_panel,
+    calculate_panel_free_cash_flows,
+    calculate_panel_growth_rates,
+    calculate_panel_ratio_of_FCF_components_to_revenue,
+    FCF_COMPONENTS,
+)
+from dcf_credit import calculate_costs_of_debt
+from dcf_synthetic import generate_company_financials, generate_daily_returns
+from dcf_instrumentation import NOOP, use_instrumentation
+
+RISK_FREE_RATE = 0.0184
+INDEX_TICKER = 'SPY'
+
+
+def _for_each_company(function):
+    """
+    Runs a per-company stage for every ticker, returns dict of ticker -> result
+    """
+    def stage(data):
+        return {ticker: function(data, ticker) for ticker in data['tickers']}
+    return stage
+
+
+def _historical_fcf(data, ticker):
+    df_IS, df_BS = data['financials'][ticker][:2]
+    return calculate_historical_free_cash_flows(df_IS, df_BS)
+
+
+def _growth(data, ticker):
+    df_IS, df_BS, df_CF = data['financials'][ticker][:3]
+    return calculate_average_net_income_growth_equity_earnings_method(
+        df_CF['dividendsPaid'], df_IS['netIncome'], df_BS['totalEquity']
+    )
+
+
+def _ratios(data, ticker):
+    df_fcf = data['historical_fcf'][ticker]
+    return calculate_ratio_of_FCF_components_to_revenue(df_fcf, ratio_year_set = df_fcf.index.max())
+
+
+def _forecast(data, ticker):
+    df_fcf = data['historical_fcf'][ticker]
+    latest_year = df_fcf.index.max()
+    return forecast_fcf(
+        data['growth'][ticker], df_fcf.copy(), list(range(latest_year, latest_year + 6)), data['ratios'][ticker]
+    )
+
+
+def _rating(data, ticker):
+    df_IS = data['financials'][ticker][0]
+    latest_year = df_IS.index.max()
+    return calculate_interest_coverage_ratio_and_synthetic_rating(
+        df_IS.loc[latest_year, 'ebitda'], df_IS.loc[latest_year, 'depreciationAndAmortization'],
+        df_IS.loc[latest_year, 'interestExpense'], RISK_FREE_RATE
+    )[1]
+
+
+def _capm(data, ticker):
+    return calculate_company_expected_return_CAPM(
+        data['daily_returns'][ticker], data['daily_returns'][INDEX_TICKER], RISK_FREE_RATE, ticker
+    )[0]
+
+
+def _wacc(data, ticker):
+    df_IS, df_BS = data['financials'][ticker][:2]
+    latest_year = df_IS.index.max()
+    eff_tax_rate = df_IS.loc[latest_year, 'incomeTaxExpense']/(
+        df_IS.loc[latest_year, 'ebitda'] - df_IS.loc[latest_year, 'depreciationAndAmortization']
+    )
+    return calculate_WACC(
+        df_BS.loc[latest_year, 'totalStockholdersEquity'], df_BS.loc[latest_year, 'totalDebt'],
+        eff_tax_rate, data['capm'][ticker], data['rating'][ticker]
+    )
+
+
+def _terminal_valuation(data, ticker):
+    df_BS, df_CF, df_SC = data['financials'][ticker][1:]
+    latest_year = df_BS.index.max()
+    return calculate_terminal_enterprise_equity_values(
+        data['forecast'][ticker], data['wacc'][ticker], df_BS.loc[latest_year, 'cashAndCashEquivalents'],
+        df_BS.loc[latest_year, 'totalDebt'], df_SC.loc[latest_year, 'numberOfShares']
+    )
+
+
+def _panel_fcf(data):
+    return calculate_panel_free_cash_flows(build_financials_panel(data['financials']))
+
+
+def _panel_growth(data):
+    return calculate_panel_growth_rates(data['panel_fcf'])
+
+
+def _panel_ratios(data):
+    return calculate_panel_ratio_of_FCF_components_to_revenue(data['panel_fcf'], ratio_year_set = 'latest')
+
+
+def _batch_forecast(data):
+    df_latest = data['panel_fcf'].groupby(level = 'ticker').tail(2).groupby(level = 'ticker').head(1)
+    return forecast_fcf_matrix(
+        base_revenue = df_latest['revenue'].to_numpy(),
+        growth_rate = data['panel_growth']['equity_earnings_growth'].to_numpy(),
+        n_years = 6,
+        fcf_ratios = data['panel_ratios'][list(FCF_COMPONENTS)].to_numpy(),
+        outlook_shifts = [0.0, 0.05, -0.05]
+    )[1]
+
+
+def _batch_cost_of_debt(data):
+    latest = data['latest_income_statement']
+    return calculate_costs_of_debt(
+        latest['ebitda'], latest['depreciationAndAmortization'], latest['interestExpense'], RISK_FREE_RATE
+    )
+
+
+def _batch_capm(data):
+    return calculate_expected_returns_CAPM(
+        data['daily_returns'][data['tickers']], data['daily_returns'][INDEX_TICKER], RISK_FREE_RATE
+    )
+
+
+def _batch_valuation(data):
+    fcf = data['batch_forecast'][:, 1:, :].transpose(0, 2, 1)
+    wacc = pd.Series(data['wacc'])[data['tickers']].to_numpy()
+    return calculate_equity_values_array(fcf, wacc[:, None], 0.0, 0.0, 1.0)
+
+
+# (stage, function, result key used by later stages)
+STAGES = [
+    ('historical_fcf', _for_each_company(_historical_fcf), 'historical_fcf'),
+    ('growth_estimation', _for_each_company(_growth), 'growth'),
+    ('fcf_ratios', _for_each_company(_ratios), 'ratios'),
+    ('forecast_fcf', _for_each_company(_forecast), 'forecast'),
+    ('synthetic_rating', _for_each_company(_rating), 'rating'),
+    ('capm', _for_each_company(_capm), 'capm'),
+    ('wacc', _for_each_company(_wacc), 'wacc'),
+    ('terminal_valuation', _for_each_company(_terminal_valuation), 'terminal_valuation'),
+    ('batch:panel_fcf', _panel_fcf, 'panel_fcf'),
+    ('batch:panel_growth', _panel_growth, 'panel_growth'),
+    ('batch:panel_ratios', _panel_ratios, 'panel_ratios'),
+    ('batch:forecast_fcf_matrix', _batch_forecast, 'batch_forecast'),
+    ('batch:cost_of_debt', _batch_cost_of_debt, 'batch_cost_of_debt'),
+    ('batch:capm', _batch_capm, 'batch_capm'),
+    ('batch:equity_values_array', _batch_valuation, 'batch_valuation'),
+]
+
+
+def run_benchmarks(n_tickers, n_years = 10, n_days = 2520, memory = True):
+    """
+    Runs every stage on n_tickers synthetic companies, returns list of result records
+    Each stage is timed on its own, then re-run under tracemalloc for peak memory (memory = True)
+    """
+    financials = generate_company_financials(n_tickers, n_years)
+    tickers = list(financials)
+    daily_returns, betas = generate_daily_returns(tickers, n_days, index_ticker = INDEX_TICKER)
+    data = {'financials': financials, 'tickers': tickers, 'daily_returns': daily_returns}
+    # latest year line-items of every company as arrays (statements are newest first), input of the credit stage
+    data['latest_income_statement'] = {
+        item: np.array([financials[ticker][0][item].iat[0] for ticker in tickers])
+        for item in ['ebitda', 'depreciationAndAmortization', 'interestExpense']
+    }
+
+    records = []
+    for stage, function, key in STAGES:
+        # no console output or stage records, only the functions themselves are measured
+        with use_instrumentation(NOOP):
+            time_start = time.perf_counter()
+            data[key] = function(data)
+            seconds = time.perf_counter() - time_start
+
+            peak_mb = None
+            if memory:
+                tracemalloc.start()
+                function(data)
+                peak_mb = tracemalloc.get_traced_memory()[1]/1024**2
+                tracemalloc.stop()
+
+        records.append({
+            'stage': stage,
+            'n_tickers': n_tickers,
+            'n_years': n_years,
+            'seconds': seconds,
+            'us_per_ticker': 1e6*seconds/n_tickers,
+            'peak_memory_mb': peak_mb,
+        })
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type = int, nargs = '+', default = [1, 100, 10_000], help = 'numbers of tickers')
+    parser.add_argument('--years', type = int, default = 10, help = 'years of financials per ticker')
+    parser.add_argument('--days', type = int, default = 2520, help = 'days of daily returns')
+    parser.add_argument('--no-memory', action = 'store_true', help = 'skip the tracemalloc pass')
+    parser.add_argument('--json', help = 'also write the results to this file')
+    args = parser.parse_args()
+
+    records = []
+    for n_tickers in args.sizes:
+        records += run_benchmarks(n_tickers, args.years, args.days, memory = not args.no_memory)
+
+    df_results = pd.DataFrame(records)
+    with pd.option_context('display.width', 200, 'display.max_rows', None, 'display.float_format', '{:,.4f}'.format):
+        print(df_results.to_string(index = False))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(records, f, indent = 2)
+
+
+if __name__ == '__main__':
+    main()
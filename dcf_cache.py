@@ -0,0 +1,168 @@
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+
+# file format -> (extension, writer, reader), parquet & feather require pyarrow
+CACHE_FORMATS = {
+    'parquet': ('parquet', lambda df, path: df.to_parquet(path, index = False), pd.read_parquet),
+    'feather': ('feather', lambda df, path: df.reset_index(drop = True).to_feather(path), pd.read_feather),
+    'pickle': ('pkl', lambda df, path: df.to_pickle(path), pd.read_pickle),
+}
+
+
+class StatementCache:
+    """
+    On-disk cache of Financial Modeling Prep statements stored in a typed columnar format (one file per key)
+    Key: (ticker, statement code, period), e.g. ('AAPL', 'IS', 'annual')
+    Inputs:
+        cache_dir - directory holding the statement files & index.json (fetch times, sizes, last access)
+        ttl - seconds before a cached statement is refreshed with the newest years
+        max_bytes - total size of cached files, least recently used statements are evicted beyond it
+        file_format - 'parquet' (default), 'feather' or 'pickle'
+    Used by dcf_fetch.FMPClient(cache = ...) underneath pull_company_financials()
+    """
+
+    def __init__(self, cache_dir, ttl = 7*24*60*60, max_bytes = 1024**3, file_format = 'parquet'):
+        if file_format not in CACHE_FORMATS:
+            raise ValueError(f"Unknown file_format: {file_format}, expected one of {list(CACHE_FORMATS)}")
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.file_format = file_format
+        self._lock = threading.RLock()
+
+        os.makedirs(cache_dir, exist_ok = True)
+        self._index_path = os.path.join(cache_dir, 'index.json')
+        if os.path.exists(self._index_path):
+            with open(self._index_path) as f:
+                self._index = json.load(f)
+        else:
+            self._index = {}
+
+    def _key(self, company_ticker, statement, period):
+        return f"{period}/{statement}/{company_ticker}"
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.{CACHE_FORMATS[self.file_format][0]}")
+
+    def _save_index(self):
+        path_tmp = f"{self._index_path}.tmp"
+        with open(path_tmp, 'w') as f:
+            json.dump(self._index, f)
+        os.replace(path_tmp, self._index_path)
+
+    def get(self, company_ticker, statement, period = 'annual'):
+        """
+        Returns (cached statement dataframe, index entry) or (None, None) if not cached
+        """
+        key = self._key(company_ticker, statement, period)
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None or not os.path.exists(self._path(key)):
+                return None, None
+            entry['last_access'] = time.time()
+        try:
+            return CACHE_FORMATS[self.file_format][2](self._path(key)), entry
+        except FileNotFoundError:
+            # evicted by another thread since the check above, a cache miss
+            return None, None
+
+    def put(self, company_ticker, statement, df_statement, period = 'annual', complete = False):
+        """
+        Stores a statement dataframe, complete = True marks that the API has no older years to offer
+        """
+        key = self._key(company_ticker, statement, period)
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok = True)
+        path_tmp = f"{path}.tmp"
+        CACHE_FORMATS[self.file_format][1](df_statement, path_tmp)
+        os.replace(path_tmp, path)
+
+        with self._lock:
+            now = time.time()
+            self._index[key] = {
+                'fetched_at': now,
+                'last_access': now,
+                'bytes': os.path.getsize(path),
+                'years': len(df_statement),
+                'complete': complete,
+            }
+            self._evict()
+            # the index is saved with every stored file, so a killed process never leaves files the index forgets
+            self._save_index()
+
+    def _evict(self):
+        """
+        Removes least recently used statements until the cache fits in max_bytes
+        """
+        total_bytes = sum(entry['bytes'] for entry in self._index.values())
+        for key in sorted(self._index, key = lambda key: self._index[key]['last_access']):
+            if total_bytes <= self.max_bytes:
+                break
+            total_bytes -= self._index.pop(key)['bytes']
+            if os.path.exists(self._path(key)):
+                os.remove(self._path(key))
+
+    def fetch(self, company_ticker, statement, years, fetch, period = 'annual'):
+        """
+        Returns the most recent `years` rows of a statement, only requesting from the API what the cache lacks
+        fetch(limit) must return the statement dataframe of the `limit` most recent years (newest first)
+
+        - Not cached: fetch(years)
+        - Cached but older than ttl: fetch only the years since the newest cached year (+ that year for restatements)
+        - Fewer years cached than asked: fetch(years) & merge in the missing older years
+          (the API only serves the most recent `limit` years, so older years cannot be requested on their own)
+        """
+        df_cached, entry = self.get(company_ticker, statement, period)
+        if df_cached is None:
+            df_statement = fetch(years)
+            self.put(company_ticker, statement, df_statement, period, complete = len(df_statement) < years)
+            return df_statement.head(years)
+
+        df_statement = df_cached
+        complete = entry['complete']
+        updated = False
+
+        if time.time() - entry['fetched_at'] > self.ttl:
+            latest_cached_year = pd.to_datetime(df_cached['date']).max().year
+            limit_new = min(years, max(1, pd.Timestamp.now().year - latest_cached_year + 1))
+            df_statement = _merge_statements(fetch(limit_new), df_statement)
+            updated = True
+
+        if len(df_statement) < years and not complete:
+            df_new = fetch(years)
+            complete = len(df_new) < years
+            df_statement = _merge_statements(df_new, df_statement)
+            updated = True
+
+        if updated:
+            self.put(company_ticker, statement, df_statement, period, complete = complete)
+        return df_statement.head(years)
+
+    def flush(self):
+        """
+        Saves the index with the latest access times (put() saves it with every stored statement),
+        called when the owning FMPClient closes
+        """
+        with self._lock:
+            self._save_index()
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._index):
+                if os.path.exists(self._path(key)):
+                    os.remove(self._path(key))
+            self._index = {}
+            self._save_index()
+
+
+def _merge_statements(df_new, df_cached):
+    """
+    Upserts newly fetched rows into cached rows by statement date, newest first (the order FMP returns)
+    """
+    df_statement = pd.concat([df_new, df_cached], ignore_index = True)
+    df_statement = df_statement.drop_duplicates(subset = 'date', keep = 'first')
+    return df_statement.sort_values('date', ascending = False, ignore_index = True)
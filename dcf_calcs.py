@@ -1,56 +1,64 @@
 import pandas as pd
 import numpy as np
 
-def pull_company_financials(company_ticker, years, api):
+from dcf_instrumentation import instrumented, report
+
+def pull_company_financials(company_ticker, years, api, client = None):
     """
     Pulls company financials using Financial Modeling Prep Python API & creates datetime index
     Inputs: company ticker, years of financials to pull, api key tied to account
+    client: dcf_fetch.FMPClient to reuse (pooled connections, shared rate limit & optional dcf_cache.StatementCache), 
+    created from api if not given
     Financials Pulled: Income Statement, Balance Sheet, Statement of Cash Flows, Company Market Characteristics
+    The 4 requests are sent concurrently
     Source: https://site.financialmodelingprep.com/developer/docs
     """
-    import requests
-    
-    IS_url = requests.get(
-        f"https://financialmodelingprep.com/api/v3/income-statement/{company_ticker}?&apikey={api}&limit={years}"
-    )
-    income_statement = IS_url.json()
+    from dcf_fetch import FMPClient
     
-    BS_url = requests.get(
-            f"https://financialmodelingprep.com/api/v3/balance-sheet-statement/{company_ticker}?&apikey={api}&limit={years}"
-        )
-    balance_sheet = BS_url.json()
-    
-    CF_url = requests.get(
-        f"https://financialmodelingprep.com/api/v3/cash-flow-statement/{company_ticker}?&apikey={api}&limit={years}"
-    )
-    statement_of_cash_flows = CF_url.json()
+    if client is None:
+        with FMPClient(api) as client:
+            statements = client.fetch_statements(company_ticker, years)
+    else:
+        statements = client.fetch_statements(company_ticker, years)
     
-    SC_url = requests.get(
-        f"https://financialmodelingprep.com/api/v3/enterprise-values/{company_ticker}?&apikey={api}&limit={years}"
-    )
-    company_stock_characteristics = SC_url.json()
-
-    try: 
-        df_IS = pd.json_normalize(income_statement)
-    except:
-        df_IS = pd.DataFrame.from_dict(income_statement)
+    return parse_company_financials(statements)
 
-    try: 
-        df_BS = pd.json_normalize(balance_sheet)
-    except:
-        df_BS = pd.DataFrame.from_dict(balance_sheet)
 
-    try: 
-        df_CF = pd.json_normalize(statement_of_cash_flows)  
-    except:
-        df_CF = pd.DataFrame.from_dict(statement_of_cash_flows)
+def pull_many_company_financials(tickers, years, api, client = None):
+    """
+    Pulls company financials of many tickers with all requests sent concurrently (within the client's rate limit)
+    Inputs: list of tickers, years of financials to pull, api key tied to account, optional dcf_fetch.FMPClient
+    Returns dict of ticker -> (Income Statement, Balance Sheet, Statement of Cash Flows, Company Market Characteristics)
+    or the exception raised while pulling/parsing that ticker
+    """
+    from dcf_fetch import FMPClient
+    
+    if client is None:
+        with FMPClient(api) as client:
+            raw_statements = client.fetch_many(tickers, years)
+    else:
+        raw_statements = client.fetch_many(tickers, years)
+    
+    company_financials = {}
+    for company_ticker, statements in raw_statements.items():
+        try:
+            if isinstance(statements, Exception):
+                raise statements
+            company_financials[company_ticker] = parse_company_financials(statements)
+        except Exception as error:
+            company_financials[company_ticker] = error
+    
+    return company_financials
 
-    try: 
-        df_SC = pd.json_normalize(company_stock_characteristics)
-    except:
-        df_SC = pd.DataFrame.from_dict(company_stock_characteristics)
 
-        
+def parse_company_financials(statements):
+    """
+    Creates the datetime & calendarYear index of statements pulled by dcf_fetch.FMPClient
+    Input: dict of statement code ('IS', 'BS', 'CF', 'SC') -> statement dataframe
+    Returns: Income Statement, Balance Sheet, Statement of Cash Flows, Company Market Characteristics
+    """
+    
+    df_IS, df_BS, df_CF, df_SC = (statements[statement].copy() for statement in ['IS', 'BS', 'CF', 'SC'])
 
     # Income Statement
     df_IS['datetime'] = pd.to_datetime(df_IS.reset_index()['date'])
@@ -117,6 +125,43 @@ def calculate_free_cash_flows_method_1(
     return fcf, change_working_cap, cap_ex
 
 
+@instrumented('historical_fcf', rows = 'df_incomeStatement')
+def calculate_historical_free_cash_flows(df_incomeStatement, df_balanceSheet):
+    """
+    Calculates historical Free Cash Flows for every year of financials at once
+    Inputs: Income Statement & Balance Sheet indexed by calendarYear (output of pull_company_financials())
+    Previous year values are looked up by year-1, the first year has no FCF
+    Utilizes the function calculate_free_cash_flows_method_1() on whole columns
+    """
+    
+    df_fcf = pd.merge(
+        df_incomeStatement[['date', 'datetime', 'revenue', 'netIncome', 'depreciationAndAmortization']],
+        df_balanceSheet[['propertyPlantEquipmentNet', 'netReceivables', 'accountPayables', 'inventory']],
+        left_index = True, right_index = True
+    )
+    df_fcf.index = df_fcf.index.astype(int)
+    df_fcf.sort_index(ascending = True, inplace = True)
+    
+    df_previous_yr = df_fcf.reindex(df_fcf.index - 1).set_axis(df_fcf.index)
+    
+    df_fcf['free_cash_flow'], df_fcf['change_working_cap'], df_fcf['cap_ex'] = calculate_free_cash_flows_method_1(
+        net_income = df_fcf['netIncome'], 
+        depr_amort_current_yr = df_fcf['depreciationAndAmortization'], 
+        depr_amort_previous_yr = df_previous_yr['depreciationAndAmortization'], 
+        ppe_current_yr = df_fcf['propertyPlantEquipmentNet'], 
+        ppe_previous_yr = df_previous_yr['propertyPlantEquipmentNet'], 
+        inventory_current_yr = df_fcf['inventory'], 
+        inventory_previous_yr = df_previous_yr['inventory'],
+        net_receivables_current_yr = df_fcf['netReceivables'], 
+        net_payables_current_yr = df_fcf['accountPayables'],
+        net_receivables_previous_yr = df_previous_yr['netReceivables'], 
+        net_payables_previous_yr = df_previous_yr['accountPayables']
+    )
+    
+    return df_fcf
+
+
+@instrumented('growth_equity_earnings', rows = 'df_incomeStatement_netIncome')
 def calculate_average_net_income_growth_equity_earnings_method(
     df_cashFlows_dividendsPaid, 
     df_incomeStatement_netIncome, 
@@ -149,93 +194,144 @@ def calculate_average_net_income_growth_equity_earnings_method(
     df_growthRate_roe['return_on_equity'] = df_growthRate_roe['netIncome']/df_growthRate_roe['bookValueEquity']
     average_growth_rate = (df_growthRate_roe['return_on_equity'] * df_growthRate_roe['retention_ratio']).mean()
     
-    print(f"Average Growth Rate of Net Income = {round(100*average_growth_rate, 2)}%")
+    report('growth_equity_earnings', average_growth_rate = average_growth_rate)
     
     return average_growth_rate
 
 
-def forecast_fcf(growth_rate_temp, df_freeCashFlow_forecasts, list_years_to_forecast_temp, df_fcf_ratios):
+# FCF line-items forecasted as a constant ratio to revenue (row order of calculate_ratio_of_FCF_components_to_revenue())
+FCF_COMPONENTS = (
+    'netIncome', 'depreciationAndAmortization', 'inventory',
+    'propertyPlantEquipmentNet', 'netReceivables', 'accountPayables'
+)
+
+# trading days per year, annualizes average daily returns
+TRADING_DAYS_PER_YEAR = 252
+
+# outlook name -> shift added to the base growth rate (+/- 5% interval around the neutral outlook)
+DEFAULT_OUTLOOK_SHIFTS = {'neutral_outlook': 0.0, 'positive_outlook': .05, 'negative_outlook': -.05}
+
+# outlook name -> (revenue column, FCF column) written by forecast_fcf()
+OUTLOOK_COLUMNS = {
+    'neutral_outlook': ('revenue', 'FCF_forecast'),
+    'positive_outlook': ('revenue_posOutlook', 'FCF_forecast_pos'),
+    'negative_outlook': ('revenue_negOutlook', 'FCF_forecast_neg'),
+}
+
+
+def outlook_columns(outlook):
+    """
+    Returns the (revenue column, FCF column) names used for an outlook in forecast_fcf()
+    Outlooks outside of the default three are named revenue_<outlook> & FCF_forecast_<outlook>
+    """
+    return OUTLOOK_COLUMNS.get(outlook, (f'revenue_{outlook}', f'FCF_forecast_{outlook}'))
+
+
+@instrumented('forecast_fcf_matrix', rows = 'base_revenue')
+def forecast_fcf_matrix(base_revenue, growth_rate, n_years, fcf_ratios, outlook_shifts = (0.0,)):
+    """
+    Forecasts revenue & Free Cash Flow for every year & outlook in one set of array operations
+    Inputs: 
+        base_revenue - revenue of the year before the first forecast year
+        growth_rate - base revenue growth rate
+        n_years - number of years to forecast
+        fcf_ratios - ratios of FCF_COMPONENTS to revenue, last axis in FCF_COMPONENTS order
+        outlook_shifts - shifts added to the growth rate, one per outlook
+    base_revenue, growth_rate & fcf_ratios[..., i] may be arrays (e.g. one entry per company), they broadcast together
+
+    Methodology:
+        Revenue(t) = Base Revenue * cumprod(1 + growth rate + outlook shift)
+        Every FCF component is a fixed ratio * revenue, so calculate_free_cash_flows_method_1() 
+        is evaluated once on the (years x outlooks) revenue matrices
+    Returns: revenue & FCF arrays shaped (..., n_years, n_outlooks)
+    """
+    
+    growth = np.add.outer(np.asarray(growth_rate, dtype = float), np.asarray(outlook_shifts, dtype = float))
+    growth_factors = np.broadcast_to(
+        (1 + growth)[..., None, :], growth.shape[:-1] + (n_years, growth.shape[-1])
+    ).cumprod(axis = -2)
+    
+    base_revenue = np.asarray(base_revenue, dtype = float)[..., None, None]
+    revenue = base_revenue * growth_factors
+    revenue_previous = np.concatenate(
+        [np.broadcast_to(base_revenue, revenue.shape[:-2] + (1,) + revenue.shape[-1:]), revenue[..., :-1, :]],
+        axis = -2
+    )
+
+    ratios = np.asarray(fcf_ratios, dtype = float)
+    ratio = {component: ratios[..., i, None, None] for i, component in enumerate(FCF_COMPONENTS)}
+    
+    fcf, change_working_cap, cap_ex = calculate_free_cash_flows_method_1(
+        net_income = ratio['netIncome'] * revenue,
+        depr_amort_current_yr = ratio['depreciationAndAmortization'] * revenue, 
+        depr_amort_previous_yr = ratio['depreciationAndAmortization'] * revenue_previous, 
+        ppe_current_yr = ratio['propertyPlantEquipmentNet'] * revenue,
+        ppe_previous_yr = ratio['propertyPlantEquipmentNet'] * revenue_previous, 
+        inventory_current_yr = ratio['inventory'] * revenue, 
+        inventory_previous_yr = ratio['inventory'] * revenue_previous, 
+        net_receivables_current_yr = ratio['netReceivables'] * revenue, 
+        net_payables_current_yr = ratio['accountPayables'] * revenue, 
+        net_receivables_previous_yr = ratio['netReceivables'] * revenue_previous, 
+        net_payables_previous_yr = ratio['accountPayables'] * revenue_previous
+    )
+    
+    return revenue, fcf
+
+
+@instrumented('forecast_fcf', rows = 'list_years_to_forecast_temp')
+def forecast_fcf(
+    growth_rate_temp, df_freeCashFlow_forecasts, list_years_to_forecast_temp, df_fcf_ratios, outlook_shifts = None
+):
     """
     Forecasts Free Cash Flow (to the Firm) - FCFF with a Negative, Neutral and Positive Outlook
     Inputs: Growth Rate, DataFrame of current Free Cash Flows and List of Years to Forecast 
-    Utilizes the function calculate_free_cash_flows_method_1() 
+    outlook_shifts: dict of outlook name -> shift to the growth rate (default = DEFAULT_OUTLOOK_SHIFTS, +/- 5%)
+    Utilizes the function forecast_fcf_matrix() to compute all years & outlooks at once
+    Returns a new dataframe with the forecast years & outlook columns added (the input dataframe is not modified)
     """
     
-    # prepare positive & negative outlook revenue columns (they begin with the same intial value as normal revenue)
-    df_freeCashFlow_forecasts.loc[
-        list_years_to_forecast_temp[0]-1, 
-        ['revenue_posOutlook', 'revenue_negOutlook']
-    ] = df_freeCashFlow_forecasts.loc[list_years_to_forecast_temp[0]-1, 'revenue']
+    if outlook_shifts is None:
+        outlook_shifts = DEFAULT_OUTLOOK_SHIFTS
     
+    base_year = list_years_to_forecast_temp[0]-1
+    base_revenue = df_freeCashFlow_forecasts.loc[base_year, 'revenue']
     
-    for year_forecast in list_years_to_forecast_temp:
-        df_freeCashFlow_forecasts.loc[year_forecast, 'revenue'] = 12
-        df_freeCashFlow_forecasts.loc[year_forecast, 'revenue'] = (
-            df_freeCashFlow_forecasts.loc[year_forecast-1, 'revenue'] * (
-                1+growth_rate_temp
-            )
-        )
-        df_freeCashFlow_forecasts.loc[year_forecast, 'revenue_posOutlook'] = (
-            df_freeCashFlow_forecasts.loc[year_forecast-1, 'revenue_posOutlook'] * (
-                1+growth_rate_temp+.05
-            )
-        )
-        df_freeCashFlow_forecasts.loc[year_forecast, 'revenue_negOutlook'] = (
-            df_freeCashFlow_forecasts.loc[year_forecast-1, 'revenue_negOutlook'] * (
-                1+growth_rate_temp-.05
-            )
-        )
-
-        df_freeCashFlow_forecasts.loc[year_forecast, ['FCF_forecast', 'change_working_cap_forecast', 'cap_ex_forecast']] = calculate_free_cash_flows_method_1(
-            net_income = (df_fcf_ratios*df_freeCashFlow_forecasts.loc[year_forecast, 'revenue']).loc['netIncome', 'ratio_to_revenue'],
-            depr_amort_current_yr = (df_fcf_ratios*df_freeCashFlow_forecasts.loc[year_forecast, 'revenue']).loc['depreciationAndAmortization', 'ratio_to_revenue'], 
-            depr_amort_previous_yr = (df_fcf_ratios*df_freeCashFlow_forecasts.loc[year_forecast-1, 'revenue']).loc['depreciationAndAmortization', 'ratio_to_revenue'], 
-            ppe_current_yr = (df_fcf_ratios*df_freeCashFlow_forecasts.loc[year_forecast, 'revenue']).loc['propertyPlantEquipmentNet', 'ratio_to_revenue'],
-            ppe_previous_yr = (df_fcf_ratios*df_freeCashFlow_forecasts.loc[year_forecast-1, 'revenue']).loc['propertyPlantEquipmentNet', 'ratio_to_revenue'], 
-            inventory_current_yr = (df_fcf_ratios*df_freeCashFlow_forecasts.loc[year_forecast, 'revenue']).loc['inventory', 'ratio_to_revenue'], 
-            inventory_previous_yr = (df_fcf_ratios*df_freeCashFlow_forecasts.loc[year_forecast-1, 'revenue']).loc['inventory', 'ratio_to_revenue'], 
-            net_receivables_current_yr = (df_fcf_ratios*df_freeCashFlow_forecasts.loc[year_forecast, 'revenue']).loc['netReceivables', 'ratio_to_revenue'], 
-            net_payables_current_yr = (df_fcf_ratios*df_freeCashFlow_forecasts.loc[year_forecast, 'revenue']).loc['accountPayables', 'ratio_to_revenue'], 
-            net_receivables_previous_yr = (df_fcf_ratios*df_freeCashFlow_forecasts.loc[year_forecast-1, 'revenue']).loc['netReceivables', 'ratio_to_revenue'], 
-            net_payables_previous_yr = (df_fcf_ratios*df_freeCashFlow_forecasts.loc[year_forecast-1, 'revenue']).loc['accountPayables', 'ratio_to_revenue'] 
-        )
-        df_freeCashFlow_forecasts.drop(['change_working_cap_forecast', 'cap_ex_forecast'], axis = 1, inplace = True)
-
-        #print("Positive Outlook")
-        df_freeCashFlow_forecasts.loc[year_forecast, ['FCF_forecast_pos', 'change_working_cap_forecast', 'cap_ex_forecast']] = calculate_free_cash_flows_method_1(
-            net_income = (df_fcf_ratios*df_freeCashFlow_forecasts.loc[year_forecast, 'revenue_posOutlook']).loc['netIncome', 'ratio_to_revenue'],
-            depr_amort_current_yr = (df_fcf_ratios*df_freeCashFlow_forecasts.loc[year_forecast, 'revenue_posOutlook']).loc['depreciationAndAmortization', 'ratio_to_revenue'], 
-            depr_amort_previous_yr = (df_fcf_ratios*df_freeCashFlow_forecasts.loc[year_forecast-1, 'revenue_posOutlook']).loc['depreciationAndAmortization', 'ratio_to_revenue'],
-            ppe_current_yr = (df_fcf_ratios*df_freeCashFlow_forecasts.loc[year_forecast, 'revenue_posOutlook']).loc['propertyPlantEquipmentNet', 'ratio_to_revenue'],
-            ppe_previous_yr = (df_fcf_ratios*df_freeCashFlow_forecasts.loc[year_forecast-1, 'revenue_posOutlook']).loc['propertyPlantEquipmentNet', 'ratio_to_revenue'], 
-            inventory_current_yr = (df_fcf_ratios*df_freeCashFlow_forecasts.loc[year_forecast, 'revenue_posOutlook']).loc['inventory', 'ratio_to_revenue'], 
-            inventory_previous_yr = (df_fcf_ratios*df_freeCashFlow_forecasts.loc[year_forecast-1, 'revenue_posOutlook']).loc['inventory', 'ratio_to_revenue'], 
-            net_receivables_current_yr = (df_fcf_ratios*df_freeCashFlow_forecasts.loc[year_forecast, 'revenue_posOutlook']).loc['netReceivables', 'ratio_to_revenue'], 
-            net_payables_current_yr = (df_fcf_ratios*df_freeCashFlow_forecasts.loc[year_forecast, 'revenue_posOutlook']).loc['accountPayables', 'ratio_to_revenue'], 
-            net_receivables_previous_yr = (df_fcf_ratios*df_freeCashFlow_forecasts.loc[year_forecast-1, 'revenue_posOutlook']).loc['netReceivables', 'ratio_to_revenue'], 
-            net_payables_previous_yr = (df_fcf_ratios*df_freeCashFlow_forecasts.loc[year_forecast-1, 'revenue_posOutlook']).loc['accountPayables', 'ratio_to_revenue'] 
-        )
-        df_freeCashFlow_forecasts.drop(['change_working_cap_forecast', 'cap_ex_forecast'], axis = 1, inplace = True)
-
-        #print("Negative Outlook")
-        df_freeCashFlow_forecasts.loc[year_forecast, ['FCF_forecast_neg', 'change_working_cap_forecast', 'cap_ex_forecast']] = calculate_free_cash_flows_method_1(
-            net_income = (df_fcf_ratios*df_freeCashFlow_forecasts.loc[year_forecast, 'revenue_negOutlook']).loc['netIncome', 'ratio_to_revenue'],
-            depr_amort_current_yr = (df_fcf_ratios*df_freeCashFlow_forecasts.loc[year_forecast, 'revenue_negOutlook']).loc['depreciationAndAmortization', 'ratio_to_revenue'], 
-            depr_amort_previous_yr = (df_fcf_ratios*df_freeCashFlow_forecasts.loc[year_forecast-1, 'revenue_negOutlook']).loc['depreciationAndAmortization', 'ratio_to_revenue'],
-            ppe_current_yr = (df_fcf_ratios*df_freeCashFlow_forecasts.loc[year_forecast, 'revenue_negOutlook']).loc['propertyPlantEquipmentNet', 'ratio_to_revenue'],
-            ppe_previous_yr = (df_fcf_ratios*df_freeCashFlow_forecasts.loc[year_forecast-1, 'revenue_negOutlook']).loc['propertyPlantEquipmentNet', 'ratio_to_revenue'], 
-            inventory_current_yr = (df_fcf_ratios*df_freeCashFlow_forecasts.loc[year_forecast, 'revenue_negOutlook']).loc['inventory', 'ratio_to_revenue'], 
-            inventory_previous_yr = (df_fcf_ratios*df_freeCashFlow_forecasts.loc[year_forecast-1, 'revenue_negOutlook']).loc['inventory', 'ratio_to_revenue'], 
-            net_receivables_current_yr = (df_fcf_ratios*df_freeCashFlow_forecasts.loc[year_forecast, 'revenue_negOutlook']).loc['netReceivables', 'ratio_to_revenue'], 
-            net_payables_current_yr = (df_fcf_ratios*df_freeCashFlow_forecasts.loc[year_forecast, 'revenue_negOutlook']).loc['accountPayables', 'ratio_to_revenue'], 
-            net_receivables_previous_yr = (df_fcf_ratios*df_freeCashFlow_forecasts.loc[year_forecast-1, 'revenue_negOutlook']).loc['netReceivables', 'ratio_to_revenue'], 
-            net_payables_previous_yr = (df_fcf_ratios*df_freeCashFlow_forecasts.loc[year_forecast-1, 'revenue_negOutlook']).loc['accountPayables', 'ratio_to_revenue'] 
-        )
-        df_freeCashFlow_forecasts.drop(['change_working_cap_forecast', 'cap_ex_forecast'], axis = 1, inplace = True)
+    revenue, fcf = forecast_fcf_matrix(
+        base_revenue = base_revenue,
+        growth_rate = growth_rate_temp,
+        n_years = len(list_years_to_forecast_temp),
+        fcf_ratios = df_fcf_ratios.loc[list(FCF_COMPONENTS), 'ratio_to_revenue'].to_numpy(dtype = float),
+        outlook_shifts = list(outlook_shifts.values())
+    )
+    
+    # one reindex adds the forecast years not yet in the dataframe
+    new_years = [year for year in list_years_to_forecast_temp if year not in df_freeCashFlow_forecasts.index]
+    df_freeCashFlow_forecasts = df_freeCashFlow_forecasts.reindex(
+        df_freeCashFlow_forecasts.index.append(pd.Index(new_years))
+    )
+    index = df_freeCashFlow_forecasts.index
+    
+    # revenue & FCF columns of every outlook as one (rows x columns) block
+    # outlook revenue columns begin with the same initial value as normal revenue
+    revenue_columns = [outlook_columns(outlook)[0] for outlook in outlook_shifts]
+    fcf_columns = [outlook_columns(outlook)[1] for outlook in outlook_shifts]
+    block_columns = revenue_columns + fcf_columns
+    block = np.full((len(index), len(block_columns)), np.nan)
+    for j, column in enumerate(block_columns):
+        if column in df_freeCashFlow_forecasts.columns:
+            block[:, j] = df_freeCashFlow_forecasts[column].to_numpy(dtype = float)
+    block[index.get_loc(base_year), :len(revenue_columns)] = base_revenue
+    block[index.get_indexer(list_years_to_forecast_temp)] = np.hstack([revenue, fcf])
+    
+    # the dataframe is built once from its column arrays & the block (column by column setitem is ~10x slower)
+    columns = {column: df_freeCashFlow_forecasts[column].array for column in df_freeCashFlow_forecasts.columns}
+    columns.update(zip(block_columns, block.T))
+    df_freeCashFlow_forecasts = pd.DataFrame(columns, index = index, copy = False)
         
     return df_freeCashFlow_forecasts
 
 
+@instrumented('fcf_ratios', rows = 'df_fcf')
 def calculate_ratio_of_FCF_components_to_revenue(df_fcf, ratio_year_set):
     """
     Takes dataframe of FCF components and calculates the ratio of components to Revenue
@@ -287,82 +383,195 @@ def calculate_ratio_of_FCF_components_to_revenue(df_fcf, ratio_year_set):
     return df_fcf_ratios
 
 
-def calculate_interest_coverage_ratio_and_synthetic_rating(ebitda, deprAndAmort, interestExpense, risk_free_rate):
+# line-items of each statement used by the panel calculations
+PANEL_COLUMNS = {
+    'IS': ['revenue', 'netIncome', 'depreciationAndAmortization'],
+    'BS': ['propertyPlantEquipmentNet', 'netReceivables', 'accountPayables', 'inventory', 'totalEquity'],
+    'CF': ['dividendsPaid'],
+}
+
+
+@instrumented('build_panel', rows = 'dict_company_financials')
+def build_financials_panel(dict_company_financials):
+    """
+    Stacks the financials of many companies into one long-format panel indexed by (ticker, calendarYear)
+    Input: dict of ticker -> (Income Statement, Balance Sheet, Statement of Cash Flows, Company Market Characteristics), 
+    e.g. output of pull_many_company_financials() (tickers that failed to pull are skipped)
+    Keeps the line-items of PANEL_COLUMNS
+    """
+    
+    dict_financials = {
+        company_ticker: company_financials for company_ticker, company_financials in dict_company_financials.items()
+        if not isinstance(company_financials, Exception)
+    }
+    
+    # one concat per statement, then a single join of the 3 statements on (ticker, calendarYear)
+    list_df_statements = [
+        pd.concat(
+            [company_financials[i][PANEL_COLUMNS[statement]] for company_financials in dict_financials.values()],
+            keys = list(dict_financials), names = ['ticker', 'calendarYear']
+        )
+        for i, statement in enumerate(['IS', 'BS', 'CF'])
+    ]
+    df_panel = list_df_statements[0].join(list_df_statements[1:], how = 'inner')
+    df_panel.index = df_panel.index.set_levels(df_panel.index.levels[1].astype(int), level = 'calendarYear')
+    return df_panel.astype(float).sort_index()
+
+
+@instrumented('panel_fcf', rows = 'df_panel')
+def calculate_panel_free_cash_flows(df_panel):
+    """
+    Panel version of calculate_historical_free_cash_flows(): FCF, change in working capital & cap ex 
+    of every (ticker, calendarYear) row in one pass
+    Previous year values come from a shift within each ticker, rows whose previous row is not year-1 have no FCF
+    Utilizes the function calculate_free_cash_flows_method_1() on whole columns
+    """
+    
+    df_panel = df_panel.sort_index()
+    years = pd.Series(df_panel.index.get_level_values('calendarYear'), index = df_panel.index)
+    df_previous_yr = df_panel.groupby(level = 'ticker').shift(1)
+    df_previous_yr[years.groupby(level = 'ticker').shift(1) != years - 1] = np.nan
+    
+    df_panel['free_cash_flow'], df_panel['change_working_cap'], df_panel['cap_ex'] = calculate_free_cash_flows_method_1(
+        net_income = df_panel['netIncome'], 
+        depr_amort_current_yr = df_panel['depreciationAndAmortization'], 
+        depr_amort_previous_yr = df_previous_yr['depreciationAndAmortization'], 
+        ppe_current_yr = df_panel['propertyPlantEquipmentNet'], 
+        ppe_previous_yr = df_previous_yr['propertyPlantEquipmentNet'], 
+        inventory_current_yr = df_panel['inventory'], 
+        inventory_previous_yr = df_previous_yr['inventory'],
+        net_receivables_current_yr = df_panel['netReceivables'], 
+        net_payables_current_yr = df_panel['accountPayables'],
+        net_receivables_previous_yr = df_previous_yr['netReceivables'], 
+        net_payables_previous_yr = df_previous_yr['accountPayables']
+    )
+    
+    return df_panel
+
+
+@instrumented('panel_growth', rows = 'df_panel')
+def calculate_panel_growth_rates(df_panel):
+    """
+    Panel version of both growth estimates of the notebook, one row per ticker:
+    - equity_earnings_growth: average Retention Ratio * Return on Equity 
+      (calculate_average_net_income_growth_equity_earnings_method())
+    - historical_revenue_growth: average annual revenue growth
+    """
+    
+    df_panel = df_panel.sort_index()
+    retention_ratio = 1 - (-1*df_panel['dividendsPaid'])/df_panel['netIncome']
+    return_on_equity = df_panel['netIncome']/df_panel['totalEquity']
+    
+    return pd.DataFrame({
+        'equity_earnings_growth': (retention_ratio * return_on_equity).groupby(level = 'ticker').mean(),
+        'historical_revenue_growth': df_panel['revenue'].groupby(level = 'ticker').pct_change().groupby(level = 'ticker').mean(),
+    })
+
+
+@instrumented('panel_fcf_ratios', rows = 'df_panel')
+def calculate_panel_ratio_of_FCF_components_to_revenue(df_panel, ratio_year_set = 'latest'):
+    """
+    Panel version of calculate_ratio_of_FCF_components_to_revenue(), one row per ticker & one column per FCF_COMPONENTS
+    ratio_year_set: 'latest' uses each ticker's most recent year, 'all' the average of all years, or a calendar year
+    Rows can be passed straight to forecast_fcf_matrix() as fcf_ratios
+    """
+    
+    df_components = df_panel[list(FCF_COMPONENTS) + ['revenue']]
+    if ratio_year_set == 'all':
+        df_components = df_components.groupby(level = 'ticker').mean()
+    elif ratio_year_set == 'latest':
+        df_components = df_components.sort_index().groupby(level = 'ticker').tail(1).droplevel('calendarYear')
+    else:
+        df_components = df_components.xs(ratio_year_set, level = 'calendarYear')
+    
+    return df_components[list(FCF_COMPONENTS)].div(df_components['revenue'], axis = 0)
+
+
+@instrumented('synthetic_rating')
+def calculate_interest_coverage_ratio_and_synthetic_rating(
+    ebitda, deprAndAmort, interestExpense, risk_free_rate, spread_table = None, zero_interest = 'best'
+):
     """
     Calculates a synthetic rating for a company using interest coverage ratio as a proxy
     Inputs: EBITA, Depreciation & Amortization, Interest Expense & Risk Free Rate
+    spread_table: dcf_credit spread table name, csv path or SpreadTable (default = dcf_credit.DEFAULT_SPREAD_TABLE)
+    zero_interest: rating of companies without interest expense, see dcf_credit.ZERO_INTEREST_POLICIES
+    For many companies at once use dcf_credit.calculate_synthetic_ratings() & calculate_costs_of_debt()
 
     Methodology Source: Aswath Damodaran https://youtu.be/N_FH89DCdGs
     """
-    
-    interest_coverage_ratio = (
-        ebitda - deprAndAmort
-    )/interestExpense
-    
-    bins = [-np.inf, 0.5, 0.8, 1.25, 1.5, 2, 2.5, 3, 3.5, 4, 4.5, 6, 7.5, 9.5, 12.5, np.inf]
-    rating = ['D', 'C', 'CC', 'CCC', 'B-', 'B', 'B+', 'BB', 'BB+', 'BBB', 'A-', 'A', 'A+', 'AA', 'AAA']
-    dict_rating_spread = {
-        'D': 0.1434,
-        'C': 0.1076,
-        'CC': 0.088,
-        'CCC': 0.0778,
-        'B-': 0.0462,
-        'B': 0.0378,
-        'B+': 0.0315,
-        'BB': 0.0215,
-        'BB+': 0.0193,
-        'BBB': 0.0159,
-        'A-': 0.0129,
-        'A': 0.014,
-        'A+': 0.0103,
-        'AA': 0.0082,
-        'AAA': 0.0067
-    }
+    from dcf_credit import calculate_synthetic_ratings
 
-    credit_default_spread = pd.cut(
-        pd.DataFrame(data = [interest_coverage_ratio])[0], bins, labels=rating
-    ).map(dict_rating_spread)[0]
+    ratings = calculate_synthetic_ratings(
+        ebitda, deprAndAmort, interestExpense, spread_table = spread_table, zero_interest = zero_interest
+    )
+    interest_coverage_ratio = ratings['interest_coverage_ratio'][()]
+    synthetic_rating = ratings['rating'][()]
+    credit_default_spread = ratings['credit_default_spread'][()]
     cost_of_debt = credit_default_spread + risk_free_rate
 
-    print(
-    f"""
-    Interest Coverage Ratio = {round(interest_coverage_ratio, 2)}
-    Synthetic Rating = {pd.cut(
-        pd.DataFrame(data = [interest_coverage_ratio])[0], bins, labels=rating)[0]}
-    Credit Default Spread = {round(100*credit_default_spread, 2)}%
-    Risk Free Rate = {round(100*risk_free_rate, 2)}%
-    Cost of Debt = {round(100*cost_of_debt, 2)}%"""
+    report(
+        'synthetic_rating',
+        interest_coverage_ratio = interest_coverage_ratio,
+        rating = synthetic_rating,
+        credit_default_spread = credit_default_spread,
+        risk_free_rate = risk_free_rate,
+        cost_of_debt = cost_of_debt
     )
     
     return interest_coverage_ratio, cost_of_debt
 
 
-def pull_daily_stock_prices(list_of_tickers, market_data_startDate, market_data_endDate):
+def pull_daily_stock_prices(list_of_tickers, market_data_startDate, market_data_endDate, price_store = None):
     """
     Function pulls daily prices of given stocks using Pandas DataReader off Yahoo
     Calculates Daily & Monthly return for the given stocks and returns 3 dataframes: 
     Daily Prices, Daily Returns, Monthly Returns
+    price_store: dcf_prices.PriceStore to read prices from a local on-disk store instead, 
+    only dates missing from the store are pulled from its price source
     """
-    import pandas_datareader as web
     
-    df_dailyStockPrices = web.DataReader(
-        list_of_tickers,
-        'yahoo',
-        market_data_startDate,
-        market_data_endDate
-    )['Close']
+    if price_store is not None:
+        price_store.update(list_of_tickers, market_data_startDate, market_data_endDate)
+        df_dailyStockPrices = price_store.get_price_frame(list_of_tickers, market_data_startDate, market_data_endDate)
+    else:
+        import pandas_datareader as web
+        
+        df_dailyStockPrices = web.DataReader(
+            list_of_tickers,
+            'yahoo',
+            market_data_startDate,
+            market_data_endDate
+        )['Close']
     
-    df_dailyReturn = df_dailyStockPrices.pct_change()
-    df_monthlyReturn = df_dailyStockPrices.groupby(pd.Grouper(freq='M')).head(1).pct_change().iloc[1:]
-    df_dailyReturn.dropna(inplace = True)
+    df_dailyReturn, df_monthlyReturn = calculate_daily_monthly_returns(df_dailyStockPrices)
 
     return df_dailyStockPrices, df_dailyReturn, df_monthlyReturn
 
 
-def calculate_company_expected_return_CAPM(df_company_returns, df_index_returns, risk_free_rate, company_ticker):
+def calculate_daily_monthly_returns(df_dailyStockPrices):
+    """
+    Daily returns & monthly returns (first price of each month) of daily prices (dates x tickers)
+    """
+    
+    df_dailyReturn = df_dailyStockPrices.pct_change()
+    df_monthlyReturn = df_dailyStockPrices.groupby(
+        df_dailyStockPrices.index.to_period('M')
+    ).head(1).pct_change().iloc[1:]
+    df_dailyReturn.dropna(inplace = True)
+    
+    return df_dailyReturn, df_monthlyReturn
+
+
+@instrumented('capm', rows = 'df_company_returns')
+def calculate_company_expected_return_CAPM(
+    df_company_returns, df_index_returns, risk_free_rate, company_ticker, periods_per_year = TRADING_DAYS_PER_YEAR
+):
     """
     Takes company & index daily returns and calculates the beta, market return and then expected stock return with CAPM
     Uses scipy package to run the linear regression against market & stock returns 
+    periods_per_year annualizes the average index return (252 trading days for daily returns)
+    For many companies at once use calculate_expected_returns_CAPM()
     """
     
     from scipy import stats
@@ -373,16 +582,106 @@ def calculate_company_expected_return_CAPM(df_company_returns, df_index_returns,
     beta, intercept, r_value, p_value, std_err = stats.linregress(X, y)
     
     # Average Daily Market Return
-    market_return = df_index_returns.mean() * 252
-    print(f"Market Return = {round(100*market_return, 2)}%")
+    market_return = df_index_returns.mean() * periods_per_year
     
     # CAPM: E[R] Expected Return
     expected_stock_return = risk_free_rate + beta * (market_return - risk_free_rate)
-    print(f"Expected Return ({company_ticker}) = {round(100*expected_stock_return, 2)}%")
+    report(
+        'capm', company_ticker = company_ticker, beta = beta, market_return = market_return,
+        expected_stock_return = expected_stock_return
+    )
     
     return expected_stock_return, market_return
 
 
+def _masked_regression_sums(returns, index_returns):
+    """
+    Sums of the pairwise-complete (company, index) observations of every column: n, Sx, Sy, Sxy, Sxx
+    Observations where either return is NaN are masked out, shapes are (dates, tickers)
+    """
+    mask = ~np.isnan(returns) & ~np.isnan(index_returns)[:, None]
+    x = np.where(mask, index_returns[:, None], 0.0)
+    y = np.where(mask, returns, 0.0)
+    return mask.astype(float), x, y, x*y, x*x
+
+
+def _beta_from_sums(n, sum_x, sum_y, sum_xy, sum_xx, min_periods):
+    """
+    Closed-form OLS slope: Beta = Cov(x, y)/Var(x) = (n*Sxy - Sx*Sy)/(n*Sxx - Sx^2), NaN below min_periods
+    """
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        beta = (n*sum_xy - sum_x*sum_y)/(n*sum_xx - sum_x**2)
+    return np.where(n >= min_periods, beta, np.nan)
+
+
+@instrumented('betas', rows = 'df_returns')
+def calculate_betas(df_returns, df_index_returns, min_periods = 2):
+    """
+    Beta of every company against the index in one matrix operation (no regression per company)
+    Inputs: returns of companies (dates x tickers), index returns (dates), 
+    min_periods - fewest complete observations to estimate a beta
+    NaN gaps are masked per company, each beta equals scipy.stats.linregress on that company's complete observations
+    Returns Series of beta per ticker
+    """
+    
+    index_returns = df_index_returns.reindex(df_returns.index).to_numpy(dtype = float)
+    n, x, y, xy, xx = _masked_regression_sums(df_returns.to_numpy(dtype = float), index_returns)
+    
+    beta = _beta_from_sums(n.sum(axis = 0), x.sum(axis = 0), y.sum(axis = 0), xy.sum(axis = 0), xx.sum(axis = 0), min_periods)
+    return pd.Series(beta, index = df_returns.columns, name = 'beta')
+
+
+@instrumented('rolling_betas', rows = 'df_returns')
+def calculate_rolling_betas(df_returns, df_index_returns, window, min_periods = None):
+    """
+    Rolling-window beta of every company against the index (dates x tickers)
+    Window sums are differences of cumulative masked sums, so every window of every company is computed at once
+    window - observations (rows) per window, min_periods - fewest complete observations in a window (default = window)
+    """
+    
+    if min_periods is None:
+        min_periods = window
+    
+    index_returns = df_index_returns.reindex(df_returns.index).to_numpy(dtype = float)
+    list_sums = _masked_regression_sums(df_returns.to_numpy(dtype = float), index_returns)
+    
+    list_window_sums = []
+    for values in list_sums:
+        cumulative = np.cumsum(values, axis = 0)
+        window_sums = cumulative.copy()
+        window_sums[window:] -= cumulative[:-window]
+        list_window_sums.append(window_sums)
+    
+    beta = _beta_from_sums(*list_window_sums, min_periods = min_periods)
+    return pd.DataFrame(beta, index = df_returns.index, columns = df_returns.columns)
+
+
+@instrumented('capm_batch', rows = 'df_returns')
+def calculate_expected_returns_CAPM(
+    df_returns, df_index_returns, risk_free_rate, periods_per_year = TRADING_DAYS_PER_YEAR, min_periods = 2
+):
+    """
+    Batch version of calculate_company_expected_return_CAPM(): beta & CAPM expected return of every company
+    Inputs: returns of companies (dates x tickers), index returns, risk free rate, 
+    periods_per_year - annualizes the average index return (252 for daily, 12 for monthly returns)
+    Returns DataFrame (one row per ticker) of beta, market_return & expected_stock_return
+    """
+    
+    df_capm = calculate_betas(df_returns, df_index_returns, min_periods = min_periods).to_frame()
+    df_capm['market_return'] = df_index_returns.mean() * periods_per_year
+    df_capm['expected_stock_return'] = risk_free_rate + df_capm['beta'] * (df_capm['market_return'] - risk_free_rate)
+    return df_capm
+
+
+def calculate_effective_tax_rate(incomeTaxExpense, ebitda, deprAndAmort):
+    """
+    Effective Tax Rate = Income Tax Expense/Earnings Before Taxes (EBITDA - Depreciation & Amortization)
+    Source: https://www.investopedia.com/ask/answers/102714/how-are-effective-tax-rates-calculated-income-statements.asp
+    """
+    return incomeTaxExpense/(ebitda - deprAndAmort)
+
+
+@instrumented('wacc')
 def calculate_WACC(total_equity, total_debt, eff_tax_rate, stock_return, cost_of_debt):
     """
     Calculates the weighted average cost of capital (WACC) with inputs for cost of debt, 
@@ -393,12 +692,14 @@ def calculate_WACC(total_equity, total_debt, eff_tax_rate, stock_return, cost_of
         cost_of_debt * (1 - eff_tax_rate) * (total_debt/(total_debt + total_equity))
         + stock_return * (total_equity/(total_debt + total_equity)) 
     )
-    print(f"Weighted Average Cost of Capital (WACC) = {round(100*wacc, 2)}%")
+    report('wacc', wacc = wacc)
     return wacc
 
 
+@instrumented('terminal_valuation', rows = 'df_FCF_selectedGrowthMethod')
 def calculate_terminal_enterprise_equity_values(
-    df_FCF_selectedGrowthMethod, wacc, cashAndCashEquivalents, totalDebt, numShares, growth_rate_perpetuity = 0.02
+    df_FCF_selectedGrowthMethod, wacc, cashAndCashEquivalents, totalDebt, numShares, growth_rate_perpetuity = 0.02,
+    forecast_start_year = None, outlooks = ('neutral_outlook', 'positive_outlook', 'negative_outlook')
 ):
     """
     Function calculates the Enterprise, Terminal and Equity Values of the given stock
@@ -406,38 +707,41 @@ def calculate_terminal_enterprise_equity_values(
     - Terminal Value = [Forecasted FCF * (1+g)]/(WACC - g)
     - Enterprise Value = PV(all Forecasted Free Cash Flows + Terminal Value)
     - Equity Value = (Enterprise Value + Cash - Debt)/#-shares-outstanding
+    forecast_start_year: first year discounted, default = year after the last historical free_cash_flow 
+    (or the first year with an FCF_forecast if there is no historical FCF); the terminal value is 
+    discounted over the number of forecast years from there to the last row
+    outlooks: outlook names forecasted by forecast_fcf()
+    For tables over many WACC/growth values use calculate_sensitivity_grid()
     
     Function created by David Mohammadi
     """
 
     import numpy_financial as npf
     
+    if forecast_start_year is None:
+        forecast_start_year = forecast_horizon_start(df_FCF_selectedGrowthMethod)
+    
     # Create dataframe to store valuations
-    df_equity_valuations = pd.DataFrame(index = ['neutral_outlook', 'positive_outlook', 'negative_outlook'])
+    df_equity_valuations = pd.DataFrame(index = list(outlooks))
+    df_forecasts = df_FCF_selectedGrowthMethod.loc[forecast_start_year:]
+    fcf_columns = [outlook_columns(outlook)[1] for outlook in outlooks]
     
     # Discounted Forecasted Free Cash Flows
-    list_FCF_forecasts_stable = df_FCF_selectedGrowthMethod.loc[2022:, 'FCF_forecast'].to_list()
-    list_FCF_forecasts_positive = df_FCF_selectedGrowthMethod.loc[2022:, 'FCF_forecast_pos'].to_list()
-    list_FCF_forecasts_negative = df_FCF_selectedGrowthMethod.loc[2022:, 'FCF_forecast_neg'].to_list()
-
-    df_equity_valuations.loc[['neutral_outlook', 'positive_outlook', 'negative_outlook'], 'npv_FCFF'] = [
-        npf.npv(wacc, list_FCF_forecasts_stable),
-        npf.npv(wacc, list_FCF_forecasts_positive),
-        npf.npv(wacc, list_FCF_forecasts_negative)
+    df_equity_valuations['npv_FCFF'] = [
+        npf.npv(wacc, df_forecasts[fcf_column].to_list()) for fcf_column in fcf_columns
     ]
+    
     # terminal value
-    df_terminal_values_outlooks = pd.DataFrame((
-        df_FCF_selectedGrowthMethod.rename(columns = {
-                'FCF_forecast': "neutral_outlook",
-                'FCF_forecast_pos': "positive_outlook",
-                'FCF_forecast_neg': "negative_outlook"
-        }).iloc[-1, :][['neutral_outlook', 'positive_outlook', 'negative_outlook']]
+    df_terminal_values_outlooks = pd.DataFrame({
+        'terminal_value': (
+            df_FCF_selectedGrowthMethod.iloc[-1][fcf_columns].to_numpy(dtype = float)
             * (1+growth_rate_perpetuity)
-    )/(wacc - growth_rate_perpetuity)).rename(columns = {2026: "terminal_value"})
+        )/(wacc - growth_rate_perpetuity)
+    }, index = list(outlooks))
 
     df_equity_valuations['terminal_value_discounted'] = (
         df_terminal_values_outlooks['terminal_value']
-        /(1+wacc)**5
+        /(1+wacc)**len(df_forecasts)
     )
     
     # enterprise value
@@ -446,10 +750,117 @@ def calculate_terminal_enterprise_equity_values(
     )
     
     # equity value
-    df_equity_valuations['estimate_stock_price'] = ((
+    df_equity_valuations['estimate_stock_price'] = (
         df_equity_valuations['enterprise_value'] 
         + cashAndCashEquivalents
         - totalDebt
-    )/numShares)[['positive_outlook', 'neutral_outlook', 'negative_outlook']]
+    )/numShares
+    
+    return df_terminal_values_outlooks, df_equity_valuations
+
+
+@instrumented('equity_values_array', rows = 'fcf_forecasts')
+def calculate_equity_values_array(
+    fcf_forecasts, wacc, cashAndCashEquivalents, totalDebt, numShares, growth_rate_perpetuity = 0.02
+):
+    """
+    Array version of calculate_terminal_enterprise_equity_values(), every input broadcasts 
+    (e.g. one entry per simulation path, grid cell or company)
+    Inputs: forecasted FCF shaped (..., n_years) - the last axis is the forecast horizon, 
+    WACC, perpetual growth rate, cash, debt & # of shares shaped (...)
+    Discounting matches numpy_financial.npv (first forecast year at t = 0), terminal value is discounted n_years
+    Returns dict of arrays: npv_FCFF, terminal_value, terminal_value_discounted, enterprise_value, estimate_stock_price
+    """
+    
+    fcf_forecasts = np.asarray(fcf_forecasts, dtype = float)
+    wacc = np.asarray(wacc, dtype = float)
+    growth_rate_perpetuity = np.asarray(growth_rate_perpetuity, dtype = float)
+    n_years = fcf_forecasts.shape[-1]
     
-    return df_terminal_values_outlooks, df_equity_valuations
\ No newline at end of file
+    discount_factors = (1+wacc[..., None])**-np.arange(n_years)
+    npv_FCFF = (fcf_forecasts * discount_factors).sum(axis = -1)
+    
+    terminal_value = fcf_forecasts[..., -1] * (1+growth_rate_perpetuity)/(wacc - growth_rate_perpetuity)
+    terminal_value_discounted = terminal_value/(1+wacc)**n_years
+    
+    enterprise_value = npv_FCFF + terminal_value_discounted
+    estimate_stock_price = (enterprise_value + cashAndCashEquivalents - totalDebt)/numShares
+    
+    return {
+        'npv_FCFF': npv_FCFF,
+        'terminal_value': terminal_value,
+        'terminal_value_discounted': terminal_value_discounted,
+        'enterprise_value': enterprise_value,
+        'estimate_stock_price': estimate_stock_price,
+    }
+
+
+@instrumented('sensitivity_grid', rows = 'wacc_values')
+def calculate_sensitivity_grid(
+    df_fcf, df_fcf_ratios, list_years_to_forecast_temp, wacc_values, growth_rate_perpetuity_values, growth_rate_values,
+    cashAndCashEquivalents, totalDebt, numShares, forecast_start_year = None, as_frame = True
+):
+    """
+    WACC x perpetual growth x revenue growth sensitivity table of the DCF valuation, the whole grid is
+    computed in one broadcast array operation (no per-cell forecast_fcf() & npf.npv calls)
+    Inputs: 
+        df_fcf, df_fcf_ratios & list of years to forecast - same as forecast_fcf()
+        arrays of WACC, perpetual growth rate & revenue growth rate values
+        cash, debt & # of shares
+        forecast_start_year - first discounted year, default = year after the last historical free_cash_flow
+    Each grid cell equals calculate_terminal_enterprise_equity_values() of the neutral outlook forecast
+    Returns DataFrame indexed by (wacc, growth_rate_perpetuity, growth_rate) with npv_FCFF, terminal_value_discounted, 
+    enterprise_value & estimate_stock_price, or dict of arrays shaped (wacc, perpetual growth, growth) if as_frame = False
+    """
+    
+    wacc_values = np.asarray(wacc_values, dtype = float)
+    growth_rate_perpetuity_values = np.asarray(growth_rate_perpetuity_values, dtype = float)
+    growth_rate_values = np.asarray(growth_rate_values, dtype = float)
+    
+    if forecast_start_year is None:
+        forecast_start_year = forecast_horizon_start(df_fcf, default = list_years_to_forecast_temp[0])
+    
+    revenue, fcf = forecast_fcf_matrix(
+        base_revenue = df_fcf.loc[list_years_to_forecast_temp[0]-1, 'revenue'],
+        growth_rate = growth_rate_values,
+        n_years = len(list_years_to_forecast_temp),
+        fcf_ratios = df_fcf_ratios.loc[list(FCF_COMPONENTS), 'ratio_to_revenue'].to_numpy(dtype = float)
+    )
+    fcf_discounted_years = fcf[:, np.asarray(list_years_to_forecast_temp) >= forecast_start_year, 0]
+    
+    # broadcast (wacc, 1, 1) x (1, perpetual growth, 1) x (1, 1, growth, years)
+    dict_grid = calculate_equity_values_array(
+        fcf_forecasts = fcf_discounted_years[None, None, :, :],
+        wacc = wacc_values[:, None, None],
+        cashAndCashEquivalents = cashAndCashEquivalents,
+        totalDebt = totalDebt,
+        numShares = numShares,
+        growth_rate_perpetuity = growth_rate_perpetuity_values[None, :, None]
+    )
+    dict_grid.pop('terminal_value')
+    grid_shape = (len(wacc_values), len(growth_rate_perpetuity_values), len(growth_rate_values))
+    dict_grid = {name: np.broadcast_to(values, grid_shape) for name, values in dict_grid.items()}
+    
+    if not as_frame:
+        return dict_grid
+    
+    return pd.DataFrame(
+        {name: values.ravel() for name, values in dict_grid.items()},
+        index = pd.MultiIndex.from_product(
+            [wacc_values, growth_rate_perpetuity_values, growth_rate_values],
+            names = ['wacc', 'growth_rate_perpetuity', 'growth_rate']
+        )
+    )
+
+
+def forecast_horizon_start(df_FCF_selectedGrowthMethod, default = None):
+    """
+    Returns the first forecast year of a forecast_fcf() dataframe: 
+    the year after the last historical free_cash_flow, or the first year with an FCF_forecast
+    default - returned when there is neither (e.g. a historical dataframe without free_cash_flow)
+    """
+    if 'free_cash_flow' in df_FCF_selectedGrowthMethod.columns and df_FCF_selectedGrowthMethod['free_cash_flow'].notna().any():
+        return df_FCF_selectedGrowthMethod['free_cash_flow'].last_valid_index() + 1
+    if 'FCF_forecast' not in df_FCF_selectedGrowthMethod.columns:
+        return default
+    return df_FCF_selectedGrowthMethod['FCF_forecast'].first_valid_index()
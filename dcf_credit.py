@@ -0,0 +1,177 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# synthetic ratings from worst to best
+RATINGS = ['D', 'C', 'CC', 'CCC', 'B-', 'B', 'B+', 'BB', 'BB+', 'BBB', 'A-', 'A', 'A+', 'AA', 'AAA']
+
+# credit default spread of every rating D ... AAA
+DEFAULT_SPREADS = [
+    0.1434, 0.1076, 0.088, 0.0778, 0.0462, 0.0378, 0.0315, 0.0215, 0.0193, 0.0159, 0.0129, 0.014, 0.0103, 0.0082, 0.0067
+]
+
+# spread table name -> ratings (worst to best), upper (inclusive) interest coverage bound of every rating but the best
+# & credit default spread of every rating
+# Methodology Source: Aswath Damodaran https://pages.stern.nyu.edu/~adamodar/New_Home_Page/datafile/ratings.htm
+SPREAD_TABLES = {
+    # bins for smaller & riskier companies, the table the single company notebook always used
+    'damodaran_small_cap': {
+        'ratings': RATINGS,
+        'bounds': [0.5, 0.8, 1.25, 1.5, 2, 2.5, 3, 3.5, 4, 4.5, 6, 7.5, 9.5, 12.5],
+        'spreads': DEFAULT_SPREADS,
+    },
+    # bins for large (market cap > $5bn) & safer companies, same spread per rating
+    'damodaran_large_cap': {
+        'ratings': RATINGS,
+        'bounds': [0.2, 0.65, 0.8, 1.25, 1.5, 1.75, 2, 2.25, 2.5, 3, 4.25, 5.5, 6.5, 8.5],
+        'spreads': DEFAULT_SPREADS,
+    },
+}
+
+DEFAULT_SPREAD_TABLE = 'damodaran_small_cap'
+
+# how companies without interest expense (0 or negative = net interest income) are rated:
+# 'best' - infinite interest coverage & the best rating of the table if EBIT is positive,
+#          -infinite coverage & the worst rating otherwise (no interest expense does not make a loss safe)
+# 'nan' - no rating, NaN spread & cost of debt
+ZERO_INTEREST_POLICIES = ('best', 'nan')
+
+# spread table name or csv path -> SpreadTable, every table is built/read once per process
+_loaded_tables = {}
+
+
+class SpreadTable:
+    """
+    Interest coverage bins, ratings & credit default spreads as arrays for sorted-bin lookups
+    Inputs: name, ratings (worst to best), upper (inclusive) coverage bound of every rating but the best, spreads
+    """
+
+    __slots__ = ('name', 'ratings', 'bounds', 'spreads')
+
+    def __init__(self, name, ratings, bounds, spreads):
+        self.name = name
+        self.ratings = np.array(ratings, dtype = object)
+        self.bounds = np.asarray(bounds, dtype = float)
+        self.spreads = np.asarray(spreads, dtype = float)
+
+        if len(self.bounds) != len(self.ratings) - 1 or len(self.spreads) != len(self.ratings):
+            raise ValueError(f"{name}: needs one spread per rating & one coverage bound per rating but the best")
+        if np.any(np.diff(self.bounds) <= 0):
+            raise ValueError(f"{name}: coverage bounds must be increasing")
+
+    def rating_index(self, interest_coverage_ratio):
+        """
+        Position of every coverage ratio's rating in ratings, -1 = no rating
+        Same bins as pd.cut over [-inf, bounds..., inf]: right-inclusive, -inf has the worst rating, NaN no rating
+        """
+        interest_coverage_ratio = np.asarray(interest_coverage_ratio, dtype = float)
+        index = np.searchsorted(self.bounds, interest_coverage_ratio, side = 'left')
+        return np.where(np.isnan(interest_coverage_ratio), -1, index)
+
+    def __repr__(self):
+        return f"SpreadTable({self.name!r}, ratings = {len(self.ratings)})"
+
+
+def read_spread_table(path):
+    """
+    Reads a spread table from a csv with columns rating, max_coverage & spread, one row per rating
+    (max_coverage = upper inclusive interest coverage bound, empty for the best rating)
+    """
+    df_table = pd.read_csv(path)
+    missing = [column for column in ['rating', 'max_coverage', 'spread'] if column not in df_table.columns]
+    if missing:
+        raise ValueError(f"{path}: missing columns {missing}")
+
+    df_table['max_coverage'] = df_table['max_coverage'].fillna(np.inf)
+    df_table = df_table.sort_values('max_coverage')
+    if np.isfinite(df_table['max_coverage'].iloc[-1]) or np.isinf(df_table['max_coverage'].iloc[:-1]).any():
+        raise ValueError(f"{path}: exactly the best rating needs an empty max_coverage")
+    return SpreadTable(
+        os.path.splitext(os.path.basename(path))[0], df_table['rating'].tolist(),
+        df_table['max_coverage'].iloc[:-1].to_numpy(), df_table['spread'].to_numpy()
+    )
+
+
+def get_spread_table(spread_table = None):
+    """
+    Returns the SpreadTable of a SPREAD_TABLES name or csv path (read_spread_table()), built once & cached
+    spread_table - name, path, SpreadTable (returned as is) or None = DEFAULT_SPREAD_TABLE
+    """
+    if spread_table is None:
+        spread_table = DEFAULT_SPREAD_TABLE
+    if isinstance(spread_table, SpreadTable):
+        return spread_table
+
+    table = _loaded_tables.get(spread_table)
+    if table is None:
+        if spread_table in SPREAD_TABLES:
+            table = SpreadTable(spread_table, **SPREAD_TABLES[spread_table])
+        elif os.path.isfile(spread_table):
+            table = read_spread_table(spread_table)
+        else:
+            raise ValueError(
+                f"Unknown spread table: {spread_table}, expected one of {list(SPREAD_TABLES)} or a csv path"
+            )
+        _loaded_tables[spread_table] = table
+    return table
+
+
+def interest_coverage_ratios(ebitda, deprAndAmort, interestExpense):
+    """
+    Interest coverage ratio = EBIT/Interest Expense of every company (arrays or scalars, broadcast)
+    Companies without interest expense (<= 0) have an infinite coverage ratio if EBIT is positive,
+    -infinite if it is not (NaN if EBIT is missing)
+    Returns (interest coverage ratios, bool mask of companies without interest expense)
+    """
+    ebit = np.asarray(ebitda, dtype = float) - np.asarray(deprAndAmort, dtype = float)
+    interestExpense = np.asarray(interestExpense, dtype = float)
+    no_interest = interestExpense <= 0
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        interest_coverage_ratio = np.where(
+            no_interest, np.where(np.isnan(ebit), np.nan, np.where(ebit > 0, np.inf, -np.inf)), ebit/interestExpense
+        )
+    return interest_coverage_ratio, no_interest
+
+
+def calculate_synthetic_ratings(ebitda, deprAndAmort, interestExpense, spread_table = None, zero_interest = 'best'):
+    """
+    Synthetic rating & credit default spread of many companies at once, interest coverage ratio as a proxy
+    Inputs: arrays (or scalars) of EBITDA, Depreciation & Amortization & Interest Expense,
+    spread table (see get_spread_table()), zero_interest - one of ZERO_INTEREST_POLICIES
+    Companies with missing inputs (NaN coverage) get no rating & a NaN spread
+
+    Returns dict of arrays: interest_coverage_ratio, rating (None = no rating), rating_index (-1 = no rating),
+    credit_default_spread
+
+    Methodology Source: Aswath Damodaran https://youtu.be/N_FH89DCdGs
+    """
+    if zero_interest not in ZERO_INTEREST_POLICIES:
+        raise ValueError(f"Unknown zero_interest: {zero_interest}, expected one of {list(ZERO_INTEREST_POLICIES)}")
+    table = get_spread_table(spread_table)
+
+    interest_coverage_ratio, no_interest = interest_coverage_ratios(ebitda, deprAndAmort, interestExpense)
+    # one sorted-bin lookup for every company
+    rating_index = table.rating_index(interest_coverage_ratio)
+    if zero_interest == 'nan':
+        rating_index = np.where(no_interest, -1, rating_index)
+
+    rated = rating_index >= 0
+    return {
+        'interest_coverage_ratio': interest_coverage_ratio,
+        'rating': np.where(rated, table.ratings[rating_index], None),
+        'rating_index': rating_index,
+        'credit_default_spread': np.where(rated, table.spreads[rating_index], np.nan),
+    }
+
+
+def calculate_costs_of_debt(
+    ebitda, deprAndAmort, interestExpense, risk_free_rate, spread_table = None, zero_interest = 'best'
+):
+    """
+    Cost of Debt = Risk Free Rate + synthetic rating Credit Default Spread of every company in one array call
+    Inputs as calculate_synthetic_ratings() plus the risk free rate (scalar or array)
+    """
+    return risk_free_rate + calculate_synthetic_ratings(
+        ebitda, deprAndAmort, interestExpense, spread_table = spread_table, zero_interest = zero_interest
+    )['credit_default_spread']
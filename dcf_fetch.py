@@ -0,0 +1,178 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+FMP_BASE_URL = "https://financialmodelingprep.com/api/v3"
+
+# statement code (prefix used for the saved .csv files) -> Financial Modeling Prep endpoint
+FMP_STATEMENT_ENDPOINTS = {
+    'IS': 'income-statement',
+    'BS': 'balance-sheet-statement',
+    'CF': 'cash-flow-statement',
+    'SC': 'enterprise-values',
+}
+
+
+class RateLimiter:
+    """
+    Thread-safe limiter spacing requests evenly to stay within a requests-per-minute budget
+    pause() pushes every waiting thread back, used when the API answers HTTP 429 (too many requests)
+    """
+
+    def __init__(self, requests_per_minute):
+        self.interval = 60 / requests_per_minute if requests_per_minute else 0
+        self._next_slot = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+    def pause(self, seconds):
+        with self._lock:
+            self._next_slot = max(self._next_slot, time.monotonic() + seconds)
+
+
+class FMPClient:
+    """
+    Financial Modeling Prep client with pooled keep-alive connections, timeouts, retries & rate limiting
+    Inputs:
+        api - api key tied to account
+        requests_per_minute - request budget of the account (None = unlimited)
+        max_workers - concurrent requests (also the size of the connection pool)
+        timeout - seconds to wait for a response
+        max_retries - retries on connection errors, HTTP 429 & 5xx responses
+        backoff - seconds of the first retry wait, doubled every retry (a Retry-After header takes precedence)
+        base_url - API root, point at a local stub server for offline testing
+        cache - dcf_cache.StatementCache, statements are only requested for what the cache lacks
+    """
+
+    def __init__(
+        self, api, requests_per_minute = 300, max_workers = 8, timeout = 10, max_retries = 4, backoff = 1,
+        base_url = FMP_BASE_URL, cache = None
+    ):
+        self.api = api
+        self.cache = cache
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.base_url = base_url.rstrip('/')
+        self.rate_limiter = RateLimiter(requests_per_minute)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections = max_workers, pool_maxsize = max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.executor = ThreadPoolExecutor(max_workers = max_workers)
+
+    def close(self):
+        self.executor.shutdown(wait = True)
+        self.session.close()
+        if self.cache is not None:
+            self.cache.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def get_json(self, endpoint, company_ticker, years):
+        """
+        GET {base_url}/{endpoint}/{ticker}?apikey=..&limit=years, retrying with exponential backoff
+        """
+        url = f"{self.base_url}/{endpoint}/{company_ticker}"
+        params = {'apikey': self.api, 'limit': years}
+
+        for attempt in range(self.max_retries + 1):
+            wait = self.backoff * 2**attempt
+            self.rate_limiter.acquire()
+            try:
+                response = self.session.get(url, params = params, timeout = self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(wait)
+                continue
+
+            if response.status_code == 429 or response.status_code >= 500:
+                if attempt == self.max_retries:
+                    response.raise_for_status()
+                retry_after = response.headers.get('Retry-After')
+                if retry_after is not None and retry_after.isdigit():
+                    wait = int(retry_after)
+                if response.status_code == 429:
+                    self.rate_limiter.pause(wait)
+                else:
+                    time.sleep(wait)
+                continue
+
+            response.raise_for_status()
+            return response.json()
+
+    def get_statement(self, statement, company_ticker, years):
+        """
+        Returns one statement (code of FMP_STATEMENT_ENDPOINTS) of the most recent `years` as a dataframe
+        Goes through the cache if the client has one
+        """
+        def fetch(limit):
+            records = self.get_json(FMP_STATEMENT_ENDPOINTS[statement], company_ticker, limit)
+            return statement_records_to_dataframe(statement, records)
+
+        if self.cache is None:
+            return fetch(years)
+        return self.cache.fetch(company_ticker, statement, years, fetch)
+
+    def fetch_statements(self, company_ticker, years):
+        """
+        Pulls the 4 statements of one company concurrently
+        Returns dict of statement code (FMP_STATEMENT_ENDPOINTS) -> statement dataframe
+        """
+        futures = {
+            statement: self.executor.submit(self.get_statement, statement, company_ticker, years)
+            for statement in FMP_STATEMENT_ENDPOINTS
+        }
+        return {statement: future.result() for statement, future in futures.items()}
+
+    def fetch_many(self, tickers, years):
+        """
+        Pulls the 4 statements of many companies, every request of every ticker is in flight concurrently
+        Returns dict of ticker -> (dict of statement code -> statement dataframe) or the exception that stopped it
+        """
+        futures = {
+            company_ticker: {
+                statement: self.executor.submit(self.get_statement, statement, company_ticker, years)
+                for statement in FMP_STATEMENT_ENDPOINTS
+            }
+            for company_ticker in tickers
+        }
+
+        results = {}
+        for company_ticker, statement_futures in futures.items():
+            try:
+                results[company_ticker] = {
+                    statement: future.result() for statement, future in statement_futures.items()
+                }
+            except Exception as error:
+                results[company_ticker] = error
+        return results
+
+
+def statement_records_to_dataframe(statement, records):
+    """
+    Converts the json records of one statement to a dataframe (one row per period, newest first)
+    FMP answers errors (e.g. invalid api key, exceeded limit) with a json object instead of a list of records
+    """
+    if isinstance(records, dict):
+        raise ValueError(f"{statement}: {records.get('Error Message', records)}")
+    if not records:
+        raise ValueError(f"{statement}: no financials returned")
+    return pd.json_normalize(records)
@@ -0,0 +1,208 @@
+import hashlib
+import pickle
+from collections import OrderedDict
+
+from dcf_calcs import (
+    pull_company_financials,
+    calculate_historical_free_cash_flows,
+    forecast_fcf,
+    calculate_ratio_of_FCF_components_to_revenue,
+    calculate_interest_coverage_ratio_and_synthetic_rating,
+    calculate_company_expected_return_CAPM,
+    calculate_effective_tax_rate,
+    calculate_WACC,
+    calculate_terminal_enterprise_equity_values,
+)
+from dcf_pipeline import build_config, build_fmp_client, fetch_market_inputs, estimate_growth_rate
+
+
+def _node_financials(config):
+    with build_fmp_client(config) as client:
+        return pull_company_financials(config['company_ticker'], config['years'], config['api'], client = client)
+
+
+def _node_daily_returns(config, financials):
+    return fetch_market_inputs(config['company_ticker'], financials[0], config)
+
+
+def _node_historical_fcf(config, financials):
+    df_incomeStatement, df_balanceSheet = financials[:2]
+    return calculate_historical_free_cash_flows(df_incomeStatement, df_balanceSheet)
+
+
+def _node_growth_rate(config, financials, historical_fcf):
+    df_incomeStatement, df_balanceSheet, df_statementCashFlows = financials[:3]
+    return estimate_growth_rate(
+        historical_fcf, df_incomeStatement, df_balanceSheet, df_statementCashFlows, growth_method = config['growth_method']
+    )
+
+
+def _node_fcf_ratios(config, historical_fcf):
+    ratio_year_set = config['ratio_year_set']
+    if ratio_year_set == 'latest':
+        ratio_year_set = historical_fcf.index.max()
+    return calculate_ratio_of_FCF_components_to_revenue(historical_fcf, ratio_year_set = ratio_year_set)
+
+
+def _node_fcf_forecast(config, historical_fcf, growth_rate, fcf_ratios):
+    latest_year = historical_fcf.index.max()
+    return forecast_fcf(
+        growth_rate_temp = growth_rate,
+        df_freeCashFlow_forecasts = historical_fcf.copy(),
+        list_years_to_forecast_temp = list(range(latest_year, latest_year + config['forecast_years'] + 1)),
+        df_fcf_ratios = fcf_ratios,
+        outlook_shifts = config['outlook_shifts']
+    )
+
+
+def _node_cost_of_debt(config, financials):
+    df_incomeStatement = financials[0]
+    latest_year = df_incomeStatement.index.max()
+    interest_coverage_ratio, cost_of_debt = calculate_interest_coverage_ratio_and_synthetic_rating(
+        ebitda = df_incomeStatement.loc[latest_year, 'ebitda'],
+        deprAndAmort = df_incomeStatement.loc[latest_year, 'depreciationAndAmortization'],
+        interestExpense = df_incomeStatement.loc[latest_year, 'interestExpense'],
+        risk_free_rate = config['risk_free_rate'],
+        spread_table = config['spread_table']
+    )
+    return cost_of_debt
+
+
+def _node_expected_return(config, daily_returns):
+    expected_stock_return, market_return = calculate_company_expected_return_CAPM(
+        df_company_returns = daily_returns[config['company_ticker']],
+        df_index_returns = daily_returns[config['index_ticker']],
+        risk_free_rate = config['risk_free_rate'],
+        company_ticker = config['company_ticker']
+    )
+    return expected_stock_return
+
+
+def _node_wacc(config, financials, cost_of_debt, expected_return):
+    df_incomeStatement, df_balanceSheet = financials[:2]
+    latest_year = df_incomeStatement.index.max()
+    return calculate_WACC(
+        total_equity = df_balanceSheet.loc[latest_year, 'totalStockholdersEquity'],
+        total_debt = df_balanceSheet.loc[latest_year, 'totalDebt'],
+        eff_tax_rate = calculate_effective_tax_rate(
+            incomeTaxExpense = df_incomeStatement.loc[latest_year, 'incomeTaxExpense'],
+            ebitda = df_incomeStatement.loc[latest_year, 'ebitda'],
+            deprAndAmort = df_incomeStatement.loc[latest_year, 'depreciationAndAmortization']
+        ),
+        stock_return = expected_return,
+        cost_of_debt = cost_of_debt
+    )
+
+
+def _node_valuation(config, financials, fcf_forecast, wacc):
+    df_incomeStatement, df_balanceSheet, df_statementCashFlows, df_stockCharacteristics = financials
+    latest_year = df_incomeStatement.index.max()
+    df_terminal_values, df_equity_valuations = calculate_terminal_enterprise_equity_values(
+        df_FCF_selectedGrowthMethod = fcf_forecast,
+        wacc = wacc,
+        cashAndCashEquivalents = df_balanceSheet.loc[latest_year, 'cashAndCashEquivalents'],
+        totalDebt = df_balanceSheet.loc[latest_year, 'totalDebt'],
+        numShares = df_stockCharacteristics.loc[latest_year, 'numberOfShares'],
+        growth_rate_perpetuity = config['growth_rate_perpetuity'],
+        forecast_start_year = latest_year + 1,
+        outlooks = list(config['outlook_shifts'])
+    )
+    return df_equity_valuations
+
+
+# node -> (function, upstream nodes, config keys the node's result depends on = its hash, nodes get the whole config)
+# fetch -> historical FCF -> growth & ratios -> forecast -> cost of debt & CAPM -> WACC -> terminal/equity value
+VALUATION_GRAPH = {
+    # rate limits & cache tuning (requests_per_minute, fetch_workers, cache_ttl, ...) do not change the pulled data
+    'financials': (_node_financials, [], ['company_ticker', 'years', 'api', 'base_url', 'cache_dir']),
+    'daily_returns': (_node_daily_returns, ['financials'], ['company_ticker', 'index_ticker', 'price_store_dir']),
+    'historical_fcf': (_node_historical_fcf, ['financials'], []),
+    'growth_rate': (_node_growth_rate, ['financials', 'historical_fcf'], ['growth_method']),
+    'fcf_ratios': (_node_fcf_ratios, ['historical_fcf'], ['ratio_year_set']),
+    'fcf_forecast': (
+        _node_fcf_forecast, ['historical_fcf', 'growth_rate', 'fcf_ratios'], ['forecast_years', 'outlook_shifts']
+    ),
+    'cost_of_debt': (_node_cost_of_debt, ['financials'], ['risk_free_rate', 'spread_table']),
+    'expected_return': (_node_expected_return, ['daily_returns'], ['company_ticker', 'index_ticker', 'risk_free_rate']),
+    'wacc': (_node_wacc, ['financials', 'cost_of_debt', 'expected_return'], []),
+    'valuation': (
+        _node_valuation, ['financials', 'fcf_forecast', 'wacc'], ['growth_rate_perpetuity', 'outlook_shifts']
+    ),
+}
+
+
+class ValuationGraph:
+    """
+    Memoized dependency graph of the single company valuation (VALUATION_GRAPH)
+    Each node's result is cached under a hash of the config keys it reads & the hashes of its upstream nodes,
+    so changing one assumption only re-runs the nodes that depend on it, e.g. a new risk_free_rate re-runs
+    cost_of_debt, expected_return, wacc & valuation while financials & the FCF forecast stay cached
+
+    Inputs: config dict - dcf_pipeline.DEFAULT_CONFIG keys plus company_ticker,
+    max_cached - results kept per node (switching back to an earlier assumption is a cache hit)
+
+    Usage:
+        graph = ValuationGraph({'company_ticker': 'AAPL', 'api': api})
+        graph.get('valuation')
+        graph.set(risk_free_rate = 0.03)
+        graph.get('valuation')   # graph.recomputed lists the nodes that ran
+    """
+
+    def __init__(self, config, max_cached = 8):
+        self.config = build_config(config)
+        self.max_cached = max_cached
+        self.recomputed = []
+        self._results = {node: OrderedDict() for node in VALUATION_GRAPH}
+        self._provided = {}
+
+    def set(self, **assumptions):
+        """
+        Changes config assumptions, dependent nodes are recomputed on the next get()
+        """
+        self.config.update(assumptions)
+
+    def provide(self, node, value):
+        """
+        Pins a node to a given value (e.g. financials loaded offline), its dependents are recomputed on the next get()
+        """
+        self._provided[node] = (value, hashlib.sha256(pickle.dumps(value)).hexdigest())
+
+    def node_key(self, node):
+        """
+        Hash of the config keys read by the node & the keys of its upstream nodes
+        """
+        if node in self._provided:
+            return self._provided[node][1]
+        function, upstream_nodes, config_keys = VALUATION_GRAPH[node]
+        inputs = (
+            node,
+            [(key, self.config[key]) for key in config_keys],
+            [self.node_key(upstream_node) for upstream_node in upstream_nodes]
+        )
+        return hashlib.sha256(pickle.dumps(inputs)).hexdigest()
+
+    def get(self, node = 'valuation'):
+        """
+        Returns the node's result, recomputing only nodes whose inputs changed (listed in self.recomputed)
+        """
+        self.recomputed = []
+        return self._get(node)
+
+    def _get(self, node):
+        if node in self._provided:
+            return self._provided[node][0]
+
+        key = self.node_key(node)
+        results = self._results[node]
+        if key in results:
+            results.move_to_end(key)
+            return results[key]
+
+        function, upstream_nodes, config_keys = VALUATION_GRAPH[node]
+        value = function(self.config, **{upstream_node: self._get(upstream_node) for upstream_node in upstream_nodes})
+        self.recomputed.append(node)
+
+        results[key] = value
+        if len(results) > self.max_cached:
+            results.popitem(last = False)
+        return value
@@ -0,0 +1,278 @@
+import contextvars
+import functools
+import inspect
+import json
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# result event of a stage -> console message (the messages the dcf_calcs functions used to print)
+CONSOLE_MESSAGES = {
+    'growth_equity_earnings': lambda values: (
+        f"Average Growth Rate of Net Income = {round(100*values['average_growth_rate'], 2)}%"
+    ),
+    'synthetic_rating': lambda values: f"""
+    Interest Coverage Ratio = {round(values['interest_coverage_ratio'], 2)}
+    Synthetic Rating = {values['rating']}
+    Credit Default Spread = {round(100*values['credit_default_spread'], 2)}%
+    Risk Free Rate = {round(100*values['risk_free_rate'], 2)}%
+    Cost of Debt = {round(100*values['cost_of_debt'], 2)}%""",
+    'capm': lambda values: (
+        f"Market Return = {round(100*values['market_return'], 2)}%\n"
+        f"Expected Return ({values['company_ticker']}) = {round(100*values['expected_stock_return'], 2)}%"
+    ),
+    'wacc': lambda values: f"Weighted Average Cost of Capital (WACC) = {round(100*values['wacc'], 2)}%",
+}
+
+# aggregate record fields -> (prometheus metric suffix, type, help)
+PROMETHEUS_METRICS = {
+    'calls': ('calls_total', 'counter', 'Calls of the stage'),
+    'seconds': ('seconds_total', 'counter', 'Wall time spent in the stage'),
+    'max_seconds': ('max_seconds', 'gauge', 'Slowest single call of the stage'),
+    'rows': ('rows_total', 'counter', 'Rows processed by the stage'),
+    'peak_memory_bytes': ('peak_memory_bytes', 'gauge', 'Peak traced memory of a single call of the stage'),
+}
+
+
+def console_hook(event):
+    """
+    Prints the result events of the dcf_calcs stages the way the single company notebook shows them
+    """
+    if event['type'] == 'result' and event['stage'] in CONSOLE_MESSAGES:
+        print(CONSOLE_MESSAGES[event['stage']](event['values']))
+
+
+class Instrumentation:
+    """
+    Collects per-stage wall time, call counts, rows processed & peak memory of the instrumented dcf_calcs functions
+    Every stage call & result is passed as an event dict to the hooks (callables), e.g.
+        {'type': 'stage', 'stage': 'wacc', 'seconds': 1.2e-05, 'rows': 1, 'peak_memory_bytes': None}
+        {'type': 'result', 'stage': 'wacc', 'values': {'wacc': 0.081}}
+    Stage events are also aggregated per stage (records(), to_json(), to_prometheus())
+
+    Inputs:
+        hooks - list of callables receiving every event (e.g. console_hook)
+        enabled - False = no-op mode, instrumented functions run without timing, hooks or records
+        track_memory - peak memory per call with tracemalloc (slows the stages down, off by default)
+    """
+
+    def __init__(self, hooks = None, enabled = True, track_memory = False):
+        self.hooks = list(hooks or [])
+        self.enabled = enabled
+        self.track_memory = track_memory
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._records = {}
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def _stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    @contextmanager
+    def stage(self, stage, rows = 1):
+        """
+        Times the code in the with block as one call of the stage
+        """
+        if not self.enabled:
+            yield
+            return
+
+        # nested stages (e.g. WACC inside a valuation) each report their own peak, resetting the peak for the inner
+        # stage keeps the outer stage's peak in its frame
+        frame = None
+        if self.track_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._local.started_tracing = True
+            current, peak = tracemalloc.get_traced_memory()
+            stack = self._stack()
+            if stack:
+                stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+            frame = {'start': current, 'peak': current}
+            stack.append(frame)
+            tracemalloc.reset_peak()
+
+        time_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - time_start
+
+            peak_memory_bytes = None
+            if frame is not None:
+                stack = self._stack()
+                stack.pop()
+                peak = max(frame['peak'], tracemalloc.get_traced_memory()[1])
+                peak_memory_bytes = peak - frame['start']
+                if stack:
+                    stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+                elif getattr(self._local, 'started_tracing', False):
+                    tracemalloc.stop()
+                    self._local.started_tracing = False
+
+            self._record(stage, seconds, rows, peak_memory_bytes)
+            self._emit({
+                'type': 'stage', 'stage': stage, 'seconds': seconds, 'rows': rows,
+                'peak_memory_bytes': peak_memory_bytes
+            })
+
+    def result(self, stage, **values):
+        """
+        Reports the results of a stage call (what the dcf_calcs functions used to print)
+        """
+        if self.enabled and self.hooks:
+            self._emit({'type': 'result', 'stage': stage, 'values': values})
+
+    def _emit(self, event):
+        for hook in self.hooks:
+            hook(event)
+
+    def _record(self, stage, seconds, rows, peak_memory_bytes):
+        with self._lock:
+            record = self._records.get(stage)
+            if record is None:
+                record = self._records[stage] = {
+                    'stage': stage, 'calls': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'rows': 0, 'peak_memory_bytes': None
+                }
+            record['calls'] += 1
+            record['seconds'] += seconds
+            record['max_seconds'] = max(record['max_seconds'], seconds)
+            record['rows'] += rows
+            if peak_memory_bytes is not None:
+                record['peak_memory_bytes'] = max(record['peak_memory_bytes'] or 0, peak_memory_bytes)
+
+    def records(self):
+        """
+        One dict per stage: stage, calls, seconds (total), max_seconds, rows (total), peak_memory_bytes
+        """
+        with self._lock:
+            return [dict(record) for record in self._records.values()]
+
+    def merge(self, records):
+        """
+        Adds records of another Instrumentation (e.g. collected in a worker process) to this one
+        """
+        with self._lock:
+            for other in records:
+                record = self._records.get(other['stage'])
+                if record is None:
+                    self._records[other['stage']] = dict(other)
+                    continue
+                record['calls'] += other['calls']
+                record['seconds'] += other['seconds']
+                record['max_seconds'] = max(record['max_seconds'], other['max_seconds'])
+                record['rows'] += other['rows']
+                if other['peak_memory_bytes'] is not None:
+                    record['peak_memory_bytes'] = max(record['peak_memory_bytes'] or 0, other['peak_memory_bytes'])
+
+    def reset(self):
+        with self._lock:
+            self._records = {}
+
+    def to_json(self, path = None):
+        """
+        Records as a JSON string, also written to path if given
+        """
+        text = json.dumps(self.records(), indent = 2)
+        if path is not None:
+            with open(path, 'w') as f:
+                f.write(text)
+        return text
+
+    def to_prometheus(self, prefix = 'dcf_stage'):
+        """
+        Records in the Prometheus text exposition format, one series per stage label
+        """
+        records = self.records()
+        lines = []
+        for field, (suffix, metric_type, description) in PROMETHEUS_METRICS.items():
+            metric = f"{prefix}_{suffix}"
+            lines += [f"# HELP {metric} {description}", f"# TYPE {metric} {metric_type}"]
+            for record in records:
+                if record[field] is not None:
+                    lines.append(f'{metric}{{stage="{record["stage"]}"}} {record[field]}')
+        return '\n'.join(lines) + '\n'
+
+
+# the instrumentation used by dcf_calcs in every thread, by default it only prints results like the notebook always did
+_default = Instrumentation(hooks = [console_hook], enabled = True)
+
+# instrumentation of the current thread/context inside use_instrumentation() blocks (None = _default), a context
+# variable so threads (e.g. the requests of the valuation service) never switch each other's instrumentation
+_active = contextvars.ContextVar('instrumentation', default = None)
+
+# shared no-op instrumentation, e.g. for batch runs that need neither timings nor console output
+NOOP = Instrumentation(enabled = False)
+
+
+def get_instrumentation():
+    instrumentation = _active.get()
+    return _default if instrumentation is None else instrumentation
+
+
+def set_instrumentation(instrumentation):
+    """
+    Makes dcf_calcs report to the given Instrumentation (NOOP = no-op mode) in every thread outside
+    use_instrumentation() blocks, returns the previous one
+    """
+    global _default
+    previous = _default
+    _default = instrumentation
+    return previous
+
+
+@contextmanager
+def use_instrumentation(instrumentation):
+    """
+    Reports to the given Instrumentation inside the with block only (the current thread/context only)
+    """
+    token = _active.set(instrumentation)
+    try:
+        yield instrumentation
+    finally:
+        _active.reset(token)
+
+
+def report(stage, **values):
+    """
+    Reports the results of a stage call to the active Instrumentation
+    """
+    get_instrumentation().result(stage, **values)
+
+
+def _count_rows(value):
+    try:
+        return len(value)
+    except TypeError:
+        return 1
+
+
+def instrumented(stage, rows = None):
+    """
+    Decorator timing every call of a function as a stage of the active Instrumentation
+    rows - name of the argument whose length is the rows processed by a call (default = 1 row per call)
+    In no-op mode the function is called straight away
+    """
+    def decorator(function):
+        position = list(inspect.signature(function).parameters).index(rows) if rows is not None else None
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            instrumentation = get_instrumentation()
+            if not instrumentation.enabled:
+                return function(*args, **kwargs)
+
+            n_rows = 1
+            if rows in kwargs:
+                n_rows = _count_rows(kwargs[rows])
+            elif position is not None and position < len(args):
+                n_rows = _count_rows(args[position])
+            with instrumentation.stage(stage, rows = n_rows):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
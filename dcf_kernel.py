@@ -0,0 +1,354 @@
+import numpy as np
+
+from dcf_calcs import FCF_COMPONENTS, DEFAULT_OUTLOOK_SHIFTS, TRADING_DAYS_PER_YEAR
+from dcf_credit import get_spread_table, interest_coverage_ratios
+
+# one valuation input record per company, every field float64 (fcf_ratios in FCF_COMPONENTS order)
+DCF_INPUT_DTYPE = np.dtype([
+    ('base_revenue', 'f8'),
+    ('growth_rate', 'f8'),
+    ('fcf_ratios', 'f8', (len(FCF_COMPONENTS),)),
+    ('ebitda', 'f8'),
+    ('depreciationAndAmortization', 'f8'),
+    ('interestExpense', 'f8'),
+    ('incomeTaxExpense', 'f8'),
+    ('beta', 'f8'),
+    ('market_return', 'f8'),
+    ('risk_free_rate', 'f8'),
+    ('total_equity', 'f8'),
+    ('total_debt', 'f8'),
+    ('cashAndCashEquivalents', 'f8'),
+    ('numShares', 'f8'),
+    ('growth_rate_perpetuity', 'f8'),
+])
+
+# valuation of a record per outlook
+DCF_OUTPUT_DTYPE = np.dtype([
+    ('interest_coverage_ratio', 'f8'),
+    ('cost_of_debt', 'f8'),
+    ('cost_of_equity', 'f8'),
+    ('eff_tax_rate', 'f8'),
+    ('wacc', 'f8'),
+    ('npv_FCFF', 'f8'),
+    ('terminal_value_discounted', 'f8'),
+    ('enterprise_value', 'f8'),
+    ('estimate_stock_price', 'f8'),
+])
+
+# value_records(engine = 'auto') without numba: interpreted loops up to this many records, array operations above
+LOOP_MAX_RECORDS = 3
+
+_DEFAULT_SHIFTS = np.array(list(DEFAULT_OUTLOOK_SHIFTS.values()))
+_numba_kernel = None
+
+
+def dcf_records(n = 1, **fields):
+    """
+    Creates n input records (DCF_INPUT_DTYPE), every field is required and broadcasts over the records
+    """
+    missing = [name for name in DCF_INPUT_DTYPE.names if name not in fields]
+    unknown = [name for name in fields if name not in DCF_INPUT_DTYPE.names]
+    if missing or unknown:
+        raise ValueError(f"Missing record fields: {missing}, unknown record fields: {unknown}")
+
+    records = np.empty(n, dtype = DCF_INPUT_DTYPE)
+    for name, value in fields.items():
+        records[name] = value
+    return records
+
+
+# field -> first column of the field in the float64 view of the records (fcf_ratios spans several)
+_INPUT_COLUMNS = {name: DCF_INPUT_DTYPE.fields[name][1]//8 for name in DCF_INPUT_DTYPE.names}
+# output field -> column in the float64 view of the outputs
+_OUTPUT_COLUMNS = {name: DCF_OUTPUT_DTYPE.fields[name][1]//8 for name in DCF_OUTPUT_DTYPE.names}
+
+# columns read & written by _value_records_loop(), module constants so numba compiles them in
+_IN_BASE_REVENUE = _INPUT_COLUMNS['base_revenue']
+_IN_GROWTH_RATE = _INPUT_COLUMNS['growth_rate']
+_IN_NET_INCOME = _INPUT_COLUMNS['fcf_ratios'] + FCF_COMPONENTS.index('netIncome')
+_IN_DEPR_AMORT = _INPUT_COLUMNS['fcf_ratios'] + FCF_COMPONENTS.index('depreciationAndAmortization')
+_IN_INVENTORY = _INPUT_COLUMNS['fcf_ratios'] + FCF_COMPONENTS.index('inventory')
+_IN_PPE = _INPUT_COLUMNS['fcf_ratios'] + FCF_COMPONENTS.index('propertyPlantEquipmentNet')
+_IN_NET_RECEIVABLES = _INPUT_COLUMNS['fcf_ratios'] + FCF_COMPONENTS.index('netReceivables')
+_IN_PAYABLES = _INPUT_COLUMNS['fcf_ratios'] + FCF_COMPONENTS.index('accountPayables')
+_IN_EBITDA = _INPUT_COLUMNS['ebitda']
+_IN_DEPRECIATION = _INPUT_COLUMNS['depreciationAndAmortization']
+_IN_INTEREST_EXPENSE = _INPUT_COLUMNS['interestExpense']
+_IN_INCOME_TAX_EXPENSE = _INPUT_COLUMNS['incomeTaxExpense']
+_IN_BETA = _INPUT_COLUMNS['beta']
+_IN_MARKET_RETURN = _INPUT_COLUMNS['market_return']
+_IN_RISK_FREE_RATE = _INPUT_COLUMNS['risk_free_rate']
+_IN_TOTAL_EQUITY = _INPUT_COLUMNS['total_equity']
+_IN_TOTAL_DEBT = _INPUT_COLUMNS['total_debt']
+_IN_CASH = _INPUT_COLUMNS['cashAndCashEquivalents']
+_IN_NUM_SHARES = _INPUT_COLUMNS['numShares']
+_IN_GROWTH_RATE_PERPETUITY = _INPUT_COLUMNS['growth_rate_perpetuity']
+_OUT_INTEREST_COVERAGE_RATIO = _OUTPUT_COLUMNS['interest_coverage_ratio']
+_OUT_COST_OF_DEBT = _OUTPUT_COLUMNS['cost_of_debt']
+_OUT_COST_OF_EQUITY = _OUTPUT_COLUMNS['cost_of_equity']
+_OUT_EFF_TAX_RATE = _OUTPUT_COLUMNS['eff_tax_rate']
+_OUT_WACC = _OUTPUT_COLUMNS['wacc']
+_OUT_NPV_FCFF = _OUTPUT_COLUMNS['npv_FCFF']
+_OUT_TERMINAL_VALUE_DISCOUNTED = _OUTPUT_COLUMNS['terminal_value_discounted']
+_OUT_ENTERPRISE_VALUE = _OUTPUT_COLUMNS['enterprise_value']
+_OUT_ESTIMATE_STOCK_PRICE = _OUTPUT_COLUMNS['estimate_stock_price']
+
+
+def _columns(records):
+    """
+    float64 (records x fields) view of the records
+    """
+    return np.ascontiguousarray(records).view(np.float64).reshape(len(records), -1)
+
+
+def _value_records_numpy(records, outlook_shifts, n_years, skip_years, table):
+    """
+    Array operations over (records x years x outlooks), see value_records()
+    Fields are read as columns of the float64 view of the records, outputs written to the float64 view of out
+    """
+    x = _columns(records)
+    field = lambda name: x[:, _INPUT_COLUMNS[name]]
+    n_records, n_outlooks = len(records), len(outlook_shifts)
+    out = np.empty((n_records, n_outlooks), dtype = DCF_OUTPUT_DTYPE)
+    out_values = out.view(np.float64).reshape(n_records, n_outlooks, -1)
+
+    # WACC: synthetic rating cost of debt, CAPM cost of equity & effective tax rate
+    ebit = field('ebitda') - field('depreciationAndAmortization')
+    interest_coverage_ratio = interest_coverage_ratios(
+        field('ebitda'), field('depreciationAndAmortization'), field('interestExpense')
+    )[0]
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        eff_tax_rate = field('incomeTaxExpense')/ebit
+    rating_index = table.rating_index(interest_coverage_ratio)
+    risk_free_rate = field('risk_free_rate')
+    cost_of_debt = risk_free_rate + np.where(rating_index >= 0, table.spreads[rating_index], np.nan)
+    cost_of_equity = risk_free_rate + field('beta') * (field('market_return') - risk_free_rate)
+    total_debt, total_equity = field('total_debt'), field('total_equity')
+    wacc = (
+        cost_of_debt * (1 - eff_tax_rate) * (total_debt/(total_debt + total_equity))
+        + cost_of_equity * (total_equity/(total_debt + total_equity))
+    )
+
+    # every FCF component is a ratio to revenue, so calculate_free_cash_flows_method_1() reduces to
+    # FCF(t) = a * Revenue(t) + b * Revenue(t-1)
+    net_income, depr_amort, inventory, ppe, net_receivables, payables = x[:, _INPUT_COLUMNS['fcf_ratios']:][:, :len(FCF_COMPONENTS)].T
+    working_cap = net_receivables + payables + inventory
+    a = (net_income - ppe - working_cap)[:, None, None]
+    b = (ppe + working_cap - depr_amort)[:, None, None]
+
+    base_revenue = field('base_revenue')[:, None, None]
+    growth_factors = 1 + field('growth_rate')[:, None] + outlook_shifts
+    revenue = base_revenue * np.cumprod(np.broadcast_to(growth_factors[:, None, :], (n_records, n_years, n_outlooks)), axis = 1)
+    revenue_previous = np.empty_like(revenue)
+    revenue_previous[:, 0] = base_revenue[:, 0]
+    revenue_previous[:, 1:] = revenue[:, :-1]
+    fcf = a*revenue + b*revenue_previous
+
+    # discounting as numpy_financial.npv (first discounted year at t = 0), terminal value over the discounted years
+    n_discounted = n_years - skip_years
+    discount_factors = (1 + wacc[:, None])**-np.arange(n_discounted, dtype = float)
+    npv_FCFF = (fcf[:, skip_years:] * discount_factors[:, :, None]).sum(axis = 1)
+
+    growth_rate_perpetuity = field('growth_rate_perpetuity')[:, None]
+    terminal_value = fcf[:, -1] * (1 + growth_rate_perpetuity)/(wacc[:, None] - growth_rate_perpetuity)
+    terminal_value_discounted = terminal_value/(1 + wacc[:, None])**n_discounted
+    enterprise_value = npv_FCFF + terminal_value_discounted
+    estimate_stock_price = (
+        enterprise_value + field('cashAndCashEquivalents')[:, None] - total_debt[:, None]
+    )/field('numShares')[:, None]
+
+    # columns in DCF_OUTPUT_DTYPE order
+    out_values[:, :, :5] = np.stack([interest_coverage_ratio, cost_of_debt, cost_of_equity, eff_tax_rate, wacc], axis = -1)[:, None, :]
+    out_values[:, :, 5:] = np.stack(
+        [npv_FCFF, terminal_value_discounted, enterprise_value, estimate_stock_price], axis = -1
+    )
+    return out
+
+
+def _value_records_loop(x, outlook_shifts, n_years, skip_years, bounds, spreads, out):
+    """
+    Scalar loop version of _value_records_numpy() on the float64 views of the records (x) & outputs (out),
+    faster than array operations for a few records & compiled with numba when it is installed
+    """
+    for i in range(x.shape[0]):
+        base_revenue, growth_rate = x[i, _IN_BASE_REVENUE], x[i, _IN_GROWTH_RATE]
+        net_income, depr_amort, inventory = x[i, _IN_NET_INCOME], x[i, _IN_DEPR_AMORT], x[i, _IN_INVENTORY]
+        ppe, net_receivables, payables = x[i, _IN_PPE], x[i, _IN_NET_RECEIVABLES], x[i, _IN_PAYABLES]
+        ebitda, deprAndAmort = x[i, _IN_EBITDA], x[i, _IN_DEPRECIATION]
+        interestExpense, incomeTaxExpense = x[i, _IN_INTEREST_EXPENSE], x[i, _IN_INCOME_TAX_EXPENSE]
+        beta, market_return, risk_free_rate = x[i, _IN_BETA], x[i, _IN_MARKET_RETURN], x[i, _IN_RISK_FREE_RATE]
+        total_equity, total_debt, cash = x[i, _IN_TOTAL_EQUITY], x[i, _IN_TOTAL_DEBT], x[i, _IN_CASH]
+        shares, growth_rate_perpetuity = x[i, _IN_NUM_SHARES], x[i, _IN_GROWTH_RATE_PERPETUITY]
+
+        ebit = ebitda - deprAndAmort
+        # no interest expense = +/- infinite coverage by the sign of EBIT (dcf_credit.interest_coverage_ratios())
+        if interestExpense <= 0 and ebit == ebit:
+            interest_coverage_ratio = np.inf if ebit > 0 else -np.inf
+        else:
+            interest_coverage_ratio = ebit/interestExpense
+        eff_tax_rate = incomeTaxExpense/ebit
+        if interest_coverage_ratio != interest_coverage_ratio:
+            spread = np.nan
+        else:
+            k = 0
+            while k < bounds.shape[0] and interest_coverage_ratio > bounds[k]:
+                k += 1
+            spread = spreads[k]
+        cost_of_debt = risk_free_rate + spread
+        cost_of_equity = risk_free_rate + beta * (market_return - risk_free_rate)
+        wacc = (
+            cost_of_debt * (1 - eff_tax_rate) * (total_debt/(total_debt + total_equity))
+            + cost_of_equity * (total_equity/(total_debt + total_equity))
+        )
+
+        working_cap = net_receivables + payables + inventory
+        a = net_income - ppe - working_cap
+        b = ppe + working_cap - depr_amort
+
+        for j in range(outlook_shifts.shape[0]):
+            revenue_previous = base_revenue
+            npv_FCFF = 0.0
+            fcf = 0.0
+            discount_factor = 1.0
+            for t in range(n_years):
+                revenue = revenue_previous * (1 + growth_rate + outlook_shifts[j])
+                fcf = a*revenue + b*revenue_previous
+                if t >= skip_years:
+                    npv_FCFF += fcf * discount_factor
+                    discount_factor /= 1 + wacc
+                revenue_previous = revenue
+
+            terminal_value_discounted = fcf * (1 + growth_rate_perpetuity)/(wacc - growth_rate_perpetuity) * discount_factor
+            enterprise_value = npv_FCFF + terminal_value_discounted
+
+            out[i, j, _OUT_INTEREST_COVERAGE_RATIO] = interest_coverage_ratio
+            out[i, j, _OUT_COST_OF_DEBT] = cost_of_debt
+            out[i, j, _OUT_COST_OF_EQUITY] = cost_of_equity
+            out[i, j, _OUT_EFF_TAX_RATE] = eff_tax_rate
+            out[i, j, _OUT_WACC] = wacc
+            out[i, j, _OUT_NPV_FCFF] = npv_FCFF
+            out[i, j, _OUT_TERMINAL_VALUE_DISCOUNTED] = terminal_value_discounted
+            out[i, j, _OUT_ENTERPRISE_VALUE] = enterprise_value
+            out[i, j, _OUT_ESTIMATE_STOCK_PRICE] = (enterprise_value + cash - total_debt)/shares
+
+
+def _compiled_loop():
+    """
+    _value_records_loop() compiled with numba (once per process), False if numba is not installed
+    """
+    global _numba_kernel
+    if _numba_kernel is None:
+        try:
+            import numba
+        except ImportError:
+            _numba_kernel = False
+        else:
+            _numba_kernel = numba.njit(cache = True, error_model = 'numpy')(_value_records_loop)
+    return _numba_kernel
+
+
+def _value_records_with_loop(records, outlook_shifts, n_years, skip_years, table, loop):
+    out = np.empty((len(records), len(outlook_shifts)), dtype = DCF_OUTPUT_DTYPE)
+    args = (
+        _columns(records), outlook_shifts, n_years, skip_years,
+        table.bounds, table.spreads, out.view(np.float64).reshape(out.shape + (-1,))
+    )
+    if loop is _value_records_loop:
+        # interpreted loops divide numpy scalars, numba follows the same rules without warnings
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            loop(*args)
+    else:
+        loop(*args)
+    return out
+
+
+def value_records(records, n_years = 6, skip_years = 1, outlook_shifts = None, engine = 'auto', spread_table = None):
+    """
+    DCF valuation of input records (DCF_INPUT_DTYPE) without pandas: synthetic rating cost of debt, CAPM cost of
+    equity, WACC, revenue & FCF forecast, terminal, enterprise & equity values for every record & outlook
+    Same formulas as value_company() (dcf_calcs steps), for a single record a call takes microseconds
+
+    Inputs:
+        records - structured array of DCF_INPUT_DTYPE (or one record), see dcf_records() & record_from_financials()
+        n_years - years forecast from base_revenue
+        skip_years - forecast years before the first discounted year; the defaults match value_company(), which
+            re-forecasts the latest historical year & discounts the 5 years after it
+        outlook_shifts - shifts added to the growth rate, one per outlook (default = DEFAULT_OUTLOOK_SHIFTS)
+        engine:
+            'numpy' - array operations over all records (fastest for batches without numba)
+            'loop' - interpreted scalar loops (fastest for a few records without numba)
+            'numba' - the scalar loops compiled with numba (needs numba installed, fastest overall)
+            'auto' - numba if installed, else loop for up to LOOP_MAX_RECORDS records & numpy above
+        spread_table - synthetic rating table, see dcf_credit.get_spread_table() (companies without interest expense
+            get the best rating)
+
+    Returns structured array of DCF_OUTPUT_DTYPE shaped (records, outlooks)
+    """
+    if outlook_shifts is None:
+        outlook_shifts = _DEFAULT_SHIFTS
+    else:
+        if isinstance(outlook_shifts, dict):
+            outlook_shifts = list(outlook_shifts.values())
+        outlook_shifts = np.asarray(outlook_shifts, dtype = float)
+    records = np.asarray(records, dtype = DCF_INPUT_DTYPE).reshape(-1)
+    table = get_spread_table(spread_table)
+
+    if engine == 'auto':
+        if _compiled_loop():
+            engine = 'numba'
+        else:
+            engine = 'loop' if len(records) <= LOOP_MAX_RECORDS else 'numpy'
+
+    if engine == 'numpy':
+        return _value_records_numpy(records, outlook_shifts, n_years, skip_years, table)
+    if engine == 'loop':
+        return _value_records_with_loop(records, outlook_shifts, n_years, skip_years, table, _value_records_loop)
+    if engine == 'numba':
+        loop = _compiled_loop()
+        if not loop:
+            raise ImportError("engine = 'numba' needs numba installed")
+        return _value_records_with_loop(records, outlook_shifts, n_years, skip_years, table, loop)
+    raise ValueError(f"Unknown engine: {engine}")
+
+
+def record_from_financials(
+    company_ticker, df_incomeStatement, df_balanceSheet, df_statementCashFlows, df_stockCharacteristics,
+    df_dailyReturn, config
+):
+    """
+    Builds the input record of a company from pulled financials & daily returns (inputs of value_company())
+    value_records() of the record with n_years = forecast_years + 1, skip_years = 1 reproduces value_company()
+    Build records once (pandas), then value them as often as needed (e.g. per request with changed assumptions)
+    """
+    from dcf_calcs import calculate_historical_free_cash_flows, calculate_ratio_of_FCF_components_to_revenue, calculate_betas
+    from dcf_pipeline import build_config, estimate_growth_rate
+
+    config = build_config(config)
+    latest_year = df_incomeStatement.index.max()
+
+    df_fcf = calculate_historical_free_cash_flows(df_incomeStatement, df_balanceSheet)
+    ratio_year_set = latest_year if config['ratio_year_set'] == 'latest' else config['ratio_year_set']
+    df_fcf_ratios = calculate_ratio_of_FCF_components_to_revenue(df_fcf, ratio_year_set = ratio_year_set)
+
+    df_index_returns = df_dailyReturn[config['index_ticker']]
+    df_returns = df_dailyReturn[[company_ticker]]
+
+    return dcf_records(
+        base_revenue = df_fcf.loc[latest_year - 1, 'revenue'],
+        growth_rate = estimate_growth_rate(
+            df_fcf, df_incomeStatement, df_balanceSheet, df_statementCashFlows, growth_method = config['growth_method']
+        ),
+        fcf_ratios = df_fcf_ratios.loc[list(FCF_COMPONENTS), 'ratio_to_revenue'].to_numpy(dtype = float),
+        ebitda = df_incomeStatement.loc[latest_year, 'ebitda'],
+        depreciationAndAmortization = df_incomeStatement.loc[latest_year, 'depreciationAndAmortization'],
+        interestExpense = df_incomeStatement.loc[latest_year, 'interestExpense'],
+        incomeTaxExpense = df_incomeStatement.loc[latest_year, 'incomeTaxExpense'],
+        beta = calculate_betas(df_returns, df_index_returns).iloc[0],
+        market_return = df_index_returns.mean() * TRADING_DAYS_PER_YEAR,
+        risk_free_rate = config['risk_free_rate'],
+        total_equity = df_balanceSheet.loc[latest_year, 'totalStockholdersEquity'],
+        total_debt = df_balanceSheet.loc[latest_year, 'totalDebt'],
+        cashAndCashEquivalents = df_balanceSheet.loc[latest_year, 'cashAndCashEquivalents'],
+        numShares = df_stockCharacteristics.loc[latest_year, 'numberOfShares'],
+        growth_rate_perpetuity = config['growth_rate_perpetuity'],
+    )[0]
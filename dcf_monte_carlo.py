@@ -0,0 +1,152 @@
+import pandas as pd
+import numpy as np
+
+from dcf_calcs import forecast_fcf_matrix, calculate_equity_values_array, FCF_COMPONENTS
+
+# inputs sampled for every path, fcf_ratios holds one distribution per FCF_COMPONENTS line-item
+MONTE_CARLO_INPUTS = [
+    'growth_rate', 'growth_rate_perpetuity', 'beta', 'risk_free_rate', 'market_return', 'credit_spread', 'fcf_ratios'
+]
+
+
+def sample_distribution(spec, rng, size):
+    """
+    Draws `size` samples of one input
+    spec:
+        number - fixed value
+        tuple ('<numpy Generator method>', *params) - e.g. ('normal', mean, std), ('uniform', low, high),
+            ('triangular', left, mode, right), ('lognormal', mean, sigma)
+        callable(rng, size) - any custom sampler
+    """
+    if callable(spec):
+        return np.asarray(spec(rng, size), dtype = float)
+    if isinstance(spec, tuple):
+        distribution, *params = spec
+        return getattr(rng, distribution)(*params, size = size)
+    return np.full(size, spec, dtype = float)
+
+
+def _simulate_chunk(seed_sequence, n_paths, distributions, company_inputs):
+    """
+    Values n_paths sampled paths with array operations, returns the estimated stock price of every path
+    Paths where WACC <= perpetual growth (no finite terminal value) are NaN
+    """
+    rng = np.random.default_rng(seed_sequence)
+    sample = {
+        name: sample_distribution(distributions[name], rng, n_paths)
+        for name in MONTE_CARLO_INPUTS if name != 'fcf_ratios'
+    }
+    fcf_ratios = np.stack(
+        [sample_distribution(distributions['fcf_ratios'][component], rng, n_paths) for component in FCF_COMPONENTS],
+        axis = -1
+    )
+
+    revenue, fcf = forecast_fcf_matrix(
+        base_revenue = company_inputs['base_revenue'],
+        growth_rate = sample['growth_rate'],
+        n_years = company_inputs['n_years'],
+        fcf_ratios = fcf_ratios
+    )
+
+    # CAPM cost of equity, synthetic rating cost of debt & WACC (same formulas as calculate_WACC())
+    cost_of_equity = sample['risk_free_rate'] + sample['beta'] * (sample['market_return'] - sample['risk_free_rate'])
+    cost_of_debt = sample['risk_free_rate'] + sample['credit_spread']
+    total_debt, total_equity = company_inputs['total_debt'], company_inputs['total_equity']
+    wacc = (
+        cost_of_debt * (1 - company_inputs['eff_tax_rate']) * (total_debt/(total_debt + total_equity))
+        + cost_of_equity * (total_equity/(total_debt + total_equity))
+    )
+
+    estimate_stock_price = calculate_equity_values_array(
+        fcf_forecasts = fcf[..., 0],
+        wacc = wacc,
+        cashAndCashEquivalents = company_inputs['cashAndCashEquivalents'],
+        totalDebt = total_debt,
+        numShares = company_inputs['numShares'],
+        growth_rate_perpetuity = sample['growth_rate_perpetuity']
+    )['estimate_stock_price']
+
+    return np.where(wacc > sample['growth_rate_perpetuity'], estimate_stock_price, np.nan)
+
+
+def simulate_stock_price(
+    base_revenue, distributions, cashAndCashEquivalents, totalDebt, total_equity, numShares, eff_tax_rate,
+    n_years = 5, n_paths = 1_000_000, chunk_size = 100_000, n_jobs = 1, seed = None,
+    quantiles = (0.05, 0.25, 0.5, 0.75, 0.95), bins = 50
+):
+    """
+    Monte Carlo DCF valuation: samples growth, FCF-to-revenue ratios, WACC inputs & terminal growth
+    and returns the distribution of estimate_stock_price
+    Inputs:
+        base_revenue - revenue of the year before the first forecast year
+        distributions - dict of MONTE_CARLO_INPUTS -> distribution spec (see sample_distribution()),
+            'fcf_ratios' is a dict of FCF_COMPONENTS -> distribution spec
+        cash, debt, book equity, # of shares & effective tax rate of the company
+        n_years - forecast horizon
+        n_paths - paths simulated, evaluated chunk_size paths at a time to bound memory
+        n_jobs - processes the chunks are spread over (1 = current process)
+        seed - every chunk draws from its own child of this seed, results do not depend on n_jobs
+
+    Methodology (per path):
+        Revenue & FCF forecast with forecast_fcf_matrix()
+        Cost of Equity = Risk Free Rate + Beta * (Market Return - Risk Free Rate)
+        Cost of Debt = Risk Free Rate + Credit Spread
+        WACC, Terminal, Enterprise & Equity Values as in calculate_WACC() & calculate_equity_values_array()
+        Paths with WACC <= perpetual growth have no terminal value and are counted as invalid
+
+    Returns dict:
+        estimate_stock_price - array of every path's price (NaN for invalid paths)
+        quantiles - Series of price quantiles
+        histogram - DataFrame of bin_left, bin_right & count
+        mean, std, n_paths, n_invalid
+    Statistics of the valid paths only (NaN quantiles, mean & std and an empty histogram if no path is valid)
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    missing = [name for name in MONTE_CARLO_INPUTS if name not in distributions]
+    missing += [component for component in FCF_COMPONENTS if component not in distributions.get('fcf_ratios', {})]
+    if missing:
+        raise ValueError(f"Missing distributions for: {missing}")
+
+    company_inputs = {
+        'base_revenue': base_revenue,
+        'n_years': n_years,
+        'cashAndCashEquivalents': cashAndCashEquivalents,
+        'total_debt': totalDebt,
+        'total_equity': total_equity,
+        'numShares': numShares,
+        'eff_tax_rate': eff_tax_rate,
+    }
+
+    chunk_sizes = [min(chunk_size, n_paths - start) for start in range(0, n_paths, chunk_size)]
+    seed_sequences = np.random.SeedSequence(seed).spawn(len(chunk_sizes))
+    args = (seed_sequences, chunk_sizes, [distributions]*len(chunk_sizes), [company_inputs]*len(chunk_sizes))
+
+    if n_jobs == 1:
+        list_prices = list(map(_simulate_chunk, *args))
+    else:
+        with ProcessPoolExecutor(max_workers = n_jobs) as executor:
+            list_prices = list(executor.map(_simulate_chunk, *args))
+
+    estimate_stock_price = np.concatenate(list_prices)
+    valid_prices = estimate_stock_price[~np.isnan(estimate_stock_price)]
+
+    if len(valid_prices):
+        counts, bin_edges = np.histogram(valid_prices, bins = bins)
+        quantile_values = np.quantile(valid_prices, quantiles)
+        mean, std = valid_prices.mean(), valid_prices.std()
+    else:
+        # every path invalid (e.g. WACC <= perpetual growth rate on all of them): NaN statistics & an empty histogram
+        counts, bin_edges = np.array([], dtype = np.int64), np.array([np.nan])
+        quantile_values = np.full(len(quantiles), np.nan)
+        mean, std = np.nan, np.nan
+
+    return {
+        'estimate_stock_price': estimate_stock_price,
+        'quantiles': pd.Series(quantile_values, index = list(quantiles), name = 'estimate_stock_price'),
+        'histogram': pd.DataFrame({'bin_left': bin_edges[:-1], 'bin_right': bin_edges[1:], 'count': counts}),
+        'mean': mean,
+        'std': std,
+        'n_paths': n_paths,
+        'n_invalid': n_paths - len(valid_prices),
+    }
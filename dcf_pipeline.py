@@ -0,0 +1,495 @@
+import pandas as pd
+
+from dcf_calcs import (
+    pull_company_financials,
+    pull_many_company_financials,
+    calculate_historical_free_cash_flows,
+    calculate_average_net_income_growth_equity_earnings_method,
+    forecast_fcf,
+    calculate_ratio_of_FCF_components_to_revenue,
+    calculate_interest_coverage_ratio_and_synthetic_rating,
+    pull_daily_stock_prices,
+    calculate_company_expected_return_CAPM,
+    calculate_effective_tax_rate,
+    calculate_WACC,
+    calculate_terminal_enterprise_equity_values,
+    DEFAULT_OUTLOOK_SHIFTS,
+)
+from dcf_instrumentation import Instrumentation, NOOP, use_instrumentation
+
+# assumptions used by the single company notebook, override any of them through the config passed to value_universe()
+DEFAULT_CONFIG = {
+    'api': None,                        # financialmodelingprep API key
+    'years': 10,                        # years of financials to pull
+    'requests_per_minute': 300,         # financialmodelingprep request budget
+    'fetch_workers': 8,                 # concurrent financialmodelingprep requests
+    'base_url': None,                   # financialmodelingprep API root (None = live API)
+    'cache_dir': None,                  # directory of the dcf_cache.StatementCache (None = no cache)
+    'cache_ttl': 7*24*60*60,            # seconds before cached statements are topped up with new years
+    'cache_max_bytes': 1024**3,
+    'cache_format': 'parquet',
+    'risk_free_rate': 0.0184,
+    'spread_table': 'damodaran_small_cap', # synthetic rating table, see dcf_credit.SPREAD_TABLES (or a csv path)
+    'index_ticker': 'SPY',              # market index used for CAPM
+    'price_store_dir': None,            # directory of a dcf_prices.PriceStore (None = pull prices off Yahoo every run)
+    'growth_method': 'equity_earnings', # 'equity_earnings' or 'historical' (average revenue growth)
+    'ratio_year_set': 'latest',         # 'latest', 'all' or a calendar year
+    'forecast_years': 5,
+    'outlook_shifts': DEFAULT_OUTLOOK_SHIFTS,
+    'growth_rate_perpetuity': 0.02,
+    'max_workers': None,                # processes used for the valuation stage (None = # of cpus, 1 = no pool)
+    'chunksize': 32,                    # tickers sent to a worker process at a time
+    'stream_batch_size': 50,            # tickers fetched together & checkpointed together by stream_universe()
+}
+
+VALUATION_COLUMNS = [
+    'ticker', 'outlook', 'calendarYear', 'growth_rate', 'cost_of_debt', 'expected_stock_return', 'wacc',
+    'npv_FCFF', 'terminal_value_discounted', 'enterprise_value', 'estimate_stock_price', 'stockPrice', 'error'
+]
+
+# statement -> line-items read by value_company(), stream_universe() drops the rest of FMP's ~40 columns per statement
+VALUATION_LINE_ITEMS = {
+    'IS': [
+        'date', 'datetime', 'revenue', 'netIncome', 'depreciationAndAmortization', 'ebitda', 'interestExpense',
+        'incomeTaxExpense'
+    ],
+    'BS': [
+        'propertyPlantEquipmentNet', 'netReceivables', 'accountPayables', 'inventory', 'totalEquity',
+        'totalStockholdersEquity', 'totalDebt', 'cashAndCashEquivalents'
+    ],
+    'CF': ['dividendsPaid'],
+    'SC': ['numberOfShares', 'stockPrice'],
+}
+
+
+def build_config(config = None):
+    """
+    Returns DEFAULT_CONFIG updated with the given config dict
+    """
+    config_full = dict(DEFAULT_CONFIG)
+    config_full.update(config or {})
+    return config_full
+
+
+def build_fmp_client(config):
+    """
+    Creates the dcf_fetch.FMPClient described by the config (shared by every ticker of a run)
+    """
+    from dcf_fetch import FMPClient, FMP_BASE_URL
+    from dcf_cache import StatementCache
+
+    cache = None
+    if config['cache_dir'] is not None:
+        cache = StatementCache(
+            cache_dir = config['cache_dir'],
+            ttl = config['cache_ttl'],
+            max_bytes = config['cache_max_bytes'],
+            file_format = config['cache_format']
+        )
+
+    return FMPClient(
+        api = config['api'],
+        requests_per_minute = config['requests_per_minute'],
+        max_workers = config['fetch_workers'],
+        base_url = config['base_url'] or FMP_BASE_URL,
+        cache = cache
+    )
+
+
+def fetch_market_inputs(company_ticker, df_incomeStatement, config):
+    """
+    Pulls daily returns of the company & the index over the years of financials
+    Prices come from the local price store if config['price_store_dir'] is set
+    """
+    from dcf_prices import PriceStore
+
+    price_store = None
+    if config['price_store_dir'] is not None:
+        price_store = PriceStore(config['price_store_dir'])
+
+    df_dailyStockPrices, df_dailyReturn, df_monthlyReturn = pull_daily_stock_prices(
+        list_of_tickers = [config['index_ticker'], company_ticker],
+        market_data_startDate = df_incomeStatement['datetime'].min(),
+        market_data_endDate = df_incomeStatement['datetime'].max(),
+        price_store = price_store
+    )
+    return df_dailyReturn
+
+
+def trim_company_financials(company_financials, line_items = VALUATION_LINE_ITEMS):
+    """
+    Keeps only the line-items of each statement that the valuation reads (missing line-items are left out,
+    the valuation then fails with the same error as on the full statements)
+    """
+    return tuple(
+        df_statement[[item for item in line_items[statement] if item in df_statement.columns]]
+        for statement, df_statement in zip(['IS', 'BS', 'CF', 'SC'], company_financials)
+    )
+
+
+def _company_inputs(company_ticker, company_financials, config):
+    """
+    Combines pulled financials with the company's market data into the keyword inputs of value_company()
+    """
+    df_incomeStatement, df_balanceSheet, df_statementCashFlows, df_stockCharacteristics = company_financials
+
+    return {
+        'df_incomeStatement': df_incomeStatement,
+        'df_balanceSheet': df_balanceSheet,
+        'df_statementCashFlows': df_statementCashFlows,
+        'df_stockCharacteristics': df_stockCharacteristics,
+        'df_dailyReturn': fetch_market_inputs(company_ticker, df_incomeStatement, config),
+    }
+
+
+def fetch_company_inputs(company_ticker, config, client = None):
+    """
+    Pulls everything the valuation of one company needs (I/O stage)
+    Financials: Income Statement, Balance Sheet, Statement of Cash Flows, Company Market Characteristics
+    Market Data: daily returns of the company & the index over the years of financials
+    """
+    company_financials = pull_company_financials(
+        company_ticker = company_ticker,
+        years = config['years'],
+        api = config['api'],
+        client = client
+    )
+    return _company_inputs(company_ticker, company_financials, config)
+
+
+def fetch_universe_inputs(tickers, config, client = None, trim = False):
+    """
+    Pulls everything the valuation of many companies needs, financials of all tickers are requested concurrently
+    client - dcf_fetch.FMPClient to reuse (created from the config if not given)
+    trim - keep only VALUATION_LINE_ITEMS of each statement
+    Returns dict of ticker -> inputs of value_company() or the exception that stopped the ticker
+    """
+    if client is None:
+        with build_fmp_client(config) as client:
+            dict_financials = pull_many_company_financials(tickers, config['years'], config['api'], client = client)
+    else:
+        dict_financials = pull_many_company_financials(tickers, config['years'], config['api'], client = client)
+
+    dict_inputs = {}
+    for company_ticker, company_financials in dict_financials.items():
+        try:
+            if isinstance(company_financials, Exception):
+                raise company_financials
+            if trim:
+                company_financials = trim_company_financials(company_financials)
+            dict_inputs[company_ticker] = _company_inputs(company_ticker, company_financials, config)
+        except Exception as error:
+            dict_inputs[company_ticker] = error
+    return dict_inputs
+
+
+def estimate_growth_rate(df_fcf, df_incomeStatement, df_balanceSheet, df_statementCashFlows, growth_method):
+    """
+    Growth rate used to forecast revenue
+    growth_method: 'equity_earnings' (retention ratio x return on equity) or 'historical' (average revenue growth)
+    """
+    if growth_method == 'equity_earnings':
+        return calculate_average_net_income_growth_equity_earnings_method(
+            df_cashFlows_dividendsPaid = df_statementCashFlows.loc[:, 'dividendsPaid'],
+            df_incomeStatement_netIncome = df_incomeStatement.loc[:, 'netIncome'],
+            df_balanceSheet_bookValueEquity = df_balanceSheet.loc[:, 'totalEquity']
+        )
+    if growth_method == 'historical':
+        return df_fcf['revenue'].pct_change().mean()
+    raise ValueError(f"Unknown growth_method: {growth_method}")
+
+
+def value_company(
+    company_ticker, df_incomeStatement, df_balanceSheet, df_statementCashFlows, df_stockCharacteristics,
+    df_dailyReturn, config
+):
+    """
+    Runs the DCF valuation steps of dcf_single_company_valuation.ipynb for one company (CPU stage, no I/O)
+    1. Historical Free Cash Flows
+    2. Growth, Ratios of FCF components to Revenue & FCF forecast
+    3. WACC: synthetic rating cost of debt, CAPM cost of equity, effective tax rate
+    4. Terminal, Enterprise & Equity Valuations
+    The most recent year of the income statement is used for all point-in-time inputs
+    Returns the equity valuations dataframe (one row per outlook) with the WACC inputs added as columns
+    """
+
+    latest_year = df_incomeStatement.index.max()
+
+    # 1. historical free cash flows
+    df_fcf = calculate_historical_free_cash_flows(df_incomeStatement, df_balanceSheet)
+
+    # 2. growth, ratios & forecast
+    growth_rate = estimate_growth_rate(
+        df_fcf, df_incomeStatement, df_balanceSheet, df_statementCashFlows, growth_method = config['growth_method']
+    )
+
+    ratio_year_set = latest_year if config['ratio_year_set'] == 'latest' else config['ratio_year_set']
+    df_fcf_ratios = calculate_ratio_of_FCF_components_to_revenue(df_fcf, ratio_year_set = ratio_year_set)
+
+    df_fcf_forecast = forecast_fcf(
+        growth_rate_temp = growth_rate,
+        df_freeCashFlow_forecasts = df_fcf,
+        list_years_to_forecast_temp = list(range(latest_year, latest_year + config['forecast_years'] + 1)),
+        df_fcf_ratios = df_fcf_ratios,
+        outlook_shifts = config['outlook_shifts']
+    )
+
+    # 3. WACC
+    interest_coverage_ratio, cost_of_debt = calculate_interest_coverage_ratio_and_synthetic_rating(
+        ebitda = df_incomeStatement.loc[latest_year, 'ebitda'],
+        deprAndAmort = df_incomeStatement.loc[latest_year, 'depreciationAndAmortization'],
+        interestExpense = df_incomeStatement.loc[latest_year, 'interestExpense'],
+        risk_free_rate = config['risk_free_rate'],
+        spread_table = config['spread_table']
+    )
+
+    expected_stock_return, market_return = calculate_company_expected_return_CAPM(
+        df_company_returns = df_dailyReturn[company_ticker],
+        df_index_returns = df_dailyReturn[config['index_ticker']],
+        risk_free_rate = config['risk_free_rate'],
+        company_ticker = company_ticker
+    )
+
+    effective_tax_rate = calculate_effective_tax_rate(
+        incomeTaxExpense = df_incomeStatement.loc[latest_year, 'incomeTaxExpense'],
+        ebitda = df_incomeStatement.loc[latest_year, 'ebitda'],
+        deprAndAmort = df_incomeStatement.loc[latest_year, 'depreciationAndAmortization']
+    )
+
+    wacc = calculate_WACC(
+        total_equity = df_balanceSheet.loc[latest_year, 'totalStockholdersEquity'],
+        total_debt = df_balanceSheet.loc[latest_year, 'totalDebt'],
+        eff_tax_rate = effective_tax_rate,
+        stock_return = expected_stock_return,
+        cost_of_debt = cost_of_debt
+    )
+
+    # 4. terminal, enterprise & equity values
+    df_terminal_values, df_equity_valuations = calculate_terminal_enterprise_equity_values(
+        df_FCF_selectedGrowthMethod = df_fcf_forecast,
+        wacc = wacc,
+        cashAndCashEquivalents = df_balanceSheet.loc[latest_year, 'cashAndCashEquivalents'],
+        totalDebt = df_balanceSheet.loc[latest_year, 'totalDebt'],
+        numShares = df_stockCharacteristics.loc[latest_year, 'numberOfShares'],
+        growth_rate_perpetuity = config['growth_rate_perpetuity'],
+        forecast_start_year = latest_year + 1,
+        outlooks = list(config['outlook_shifts'])
+    )
+
+    df_equity_valuations['calendarYear'] = latest_year
+    df_equity_valuations['growth_rate'] = growth_rate
+    df_equity_valuations['cost_of_debt'] = cost_of_debt
+    df_equity_valuations['expected_stock_return'] = expected_stock_return
+    df_equity_valuations['wacc'] = wacc
+    df_equity_valuations['stockPrice'] = df_stockCharacteristics.loc[latest_year, 'stockPrice']
+
+    return df_equity_valuations
+
+
+def _valuation_rows(company_ticker, df_equity_valuations = None, error = None):
+    """
+    Converts one company's equity valuations (or the error that stopped it) to rows of VALUATION_COLUMNS
+    """
+    if error is not None:
+        return [{'ticker': company_ticker, 'error': f"{type(error).__name__}: {error}"}]
+
+    df_rows = df_equity_valuations.rename_axis('outlook').reset_index()
+    df_rows['ticker'] = company_ticker
+    df_rows['error'] = None
+    return df_rows.to_dict('records')
+
+
+def _value_chunk(chunk, config, track_stages = False, track_memory = False):
+    """
+    Values a chunk of (ticker, inputs) pairs inside a worker process, errors are kept per ticker
+    Stage results are not printed, stage timings are recorded if track_stages
+    Returns (rows, instrumentation records of the chunk)
+    """
+    instrumentation = Instrumentation(track_memory = track_memory) if track_stages else NOOP
+
+    rows = []
+    with use_instrumentation(instrumentation):
+        for company_ticker, company_inputs in chunk:
+            try:
+                rows += _valuation_rows(company_ticker, value_company(company_ticker, config = config, **company_inputs))
+            except Exception as error:
+                rows += _valuation_rows(company_ticker, error = error)
+    return rows, instrumentation.records()
+
+
+def _chunked(items, chunksize):
+    """
+    Splits a list into lists of at most chunksize items
+    """
+    return [items[i:i + chunksize] for i in range(0, len(items), chunksize)]
+
+
+def value_universe(tickers, config = None, instrumentation = None):
+    """
+    Values every ticker in a universe with the full DCF pipeline
+    Inputs: list of tickers, config dict (see DEFAULT_CONFIG, api key required to pull financials),
+    instrumentation - dcf_instrumentation.Instrumentation receiving the stage records of the run
+        (fetch_inputs, every dcf_calcs stage of every worker process), None = no-op
+    Stage results (growth, rating, CAPM, WACC) are never printed in batch runs
+
+    Process:
+    1. Pull financials (concurrently, rate limited) & market data for each ticker (I/O bound)
+    2. Value the tickers in chunks across a process pool (CPU bound), see value_company()
+    A ticker that fails at any step (e.g. missing inventory column or zero interestExpense)
+    gets a single row with the error message instead of stopping the batch
+
+    Returns a tidy dataframe with one row per ticker & outlook (columns = VALUATION_COLUMNS)
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from functools import partial
+
+    config = build_config(config)
+
+    track_stages = instrumentation is not None and instrumentation.enabled
+    if instrumentation is None:
+        instrumentation = NOOP
+
+    with use_instrumentation(instrumentation), instrumentation.stage('fetch_inputs', rows = len(tickers)):
+        dict_inputs = fetch_universe_inputs(list(dict.fromkeys(tickers)), config)
+
+    rows = []
+    list_inputs = []
+    for company_ticker, company_inputs in dict_inputs.items():
+        if isinstance(company_inputs, Exception):
+            rows += _valuation_rows(company_ticker, error = company_inputs)
+        else:
+            list_inputs.append((company_ticker, company_inputs))
+
+    chunks = _chunked(list_inputs, config['chunksize'])
+    value_chunk = partial(
+        _value_chunk, config = config, track_stages = track_stages, track_memory = instrumentation.track_memory
+    )
+    if config['max_workers'] == 1:
+        list_chunk_results = list(map(value_chunk, chunks))
+    else:
+        with ProcessPoolExecutor(max_workers = config['max_workers']) as executor:
+            list_chunk_results = list(executor.map(value_chunk, chunks))
+    for chunk_rows, chunk_records in list_chunk_results:
+        rows += chunk_rows
+        instrumentation.merge(chunk_records)
+
+    df_valuations = pd.DataFrame(rows, columns = VALUATION_COLUMNS)
+    df_valuations['ticker'] = pd.Categorical(df_valuations['ticker'], categories = list(dict.fromkeys(tickers)))
+    df_valuations = df_valuations.sort_values('ticker', kind = 'stable').reset_index(drop = True)
+    df_valuations['ticker'] = df_valuations['ticker'].astype(str)
+
+    return df_valuations
+
+
+def _repair_checkpoint(checkpoint_path):
+    """
+    Cuts off a partially written last line (crash while appending), complete batches end with a newline
+    """
+    with open(checkpoint_path, 'rb+') as f:
+        content = f.read()
+        if content and not content.endswith(b'\n'):
+            f.truncate(content.rfind(b'\n') + 1)
+
+
+def load_checkpoint(checkpoint_path):
+    """
+    Valuations written by stream_universe() as one dataframe (columns = VALUATION_COLUMNS)
+    A ticker retried after an error keeps only its latest result
+    """
+    import os
+
+    if not os.path.exists(checkpoint_path) or os.path.getsize(checkpoint_path) == 0:
+        return pd.DataFrame(columns = VALUATION_COLUMNS)
+
+    _repair_checkpoint(checkpoint_path)
+    df_valuations = pd.read_csv(checkpoint_path, dtype = {'ticker': str, 'error': object})
+
+    # successful rows of a ticker replace its earlier error rows, repeated errors keep the last one
+    is_error = df_valuations['error'].notna()
+    has_valuation = df_valuations.loc[~is_error, 'ticker'].unique()
+    df_errors = df_valuations[is_error & ~df_valuations['ticker'].isin(has_valuation)]
+    df_errors = df_errors.drop_duplicates('ticker', keep = 'last')
+    df_valuations = df_valuations[~is_error | df_valuations.index.isin(df_errors.index)]
+
+    return df_valuations.reset_index(drop = True)
+
+
+def _append_checkpoint(checkpoint_path, rows):
+    """
+    Appends valuation rows to the checkpoint csv in one write, flushed to disk before returning
+    """
+    import os
+
+    df_rows = pd.DataFrame(rows, columns = VALUATION_COLUMNS)
+    df_rows['error'] = df_rows['error'].str.replace('\n', ' ', regex = False)
+    write_header = not os.path.exists(checkpoint_path) or os.path.getsize(checkpoint_path) == 0
+    with open(checkpoint_path, 'a') as f:
+        f.write(df_rows.to_csv(index = False, header = write_header))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def stream_universe(tickers, config = None, checkpoint_path = None, retry_errors = False, instrumentation = None):
+    """
+    Generator version of value_universe() with bounded memory & crash recovery
+    Tickers are fetched stream_batch_size at a time (concurrently, one shared client & rate limit), valued in the
+    current process & yielded one at a time as a dataframe of that ticker's rows (columns = VALUATION_COLUMNS)
+    Only VALUATION_LINE_ITEMS are kept from the pulled statements and each ticker's inputs are dropped once it is
+    valued, so memory does not grow with the size of the universe
+
+    checkpoint_path - csv the rows are appended to after every batch (& when the generator is closed early)
+        Tickers already in the checkpoint are skipped, so re-running after a crash resumes where it stopped
+        Read the complete results with load_checkpoint()
+    retry_errors - re-value tickers whose checkpointed result is an error (e.g. a timed out request)
+    instrumentation - dcf_instrumentation.Instrumentation receiving the stage records (None = no-op)
+
+    Usage:
+        for df_ticker_valuations in stream_universe(tickers, config, 'valuations.csv'):
+            ...
+        df_valuations = load_checkpoint('valuations.csv')
+    """
+    config = build_config(config)
+    if instrumentation is None:
+        instrumentation = NOOP
+
+    tickers = list(dict.fromkeys(tickers))
+    if checkpoint_path is not None:
+        df_checkpoint = load_checkpoint(checkpoint_path)
+        if retry_errors:
+            df_checkpoint = df_checkpoint[df_checkpoint['error'].isna()]
+        done = set(df_checkpoint['ticker'])
+        del df_checkpoint
+        tickers = [company_ticker for company_ticker in tickers if company_ticker not in done]
+
+    pending_rows = []
+    try:
+        with build_fmp_client(config) as client:
+            for batch in _chunked(tickers, config['stream_batch_size']):
+                # the instrumentation is switched only while the generator fetches & values, never while the consumer
+                # of the generator runs between yields
+                with use_instrumentation(instrumentation), instrumentation.stage('fetch_inputs', rows = len(batch)):
+                    dict_inputs = fetch_universe_inputs(batch, config, client = client, trim = True)
+
+                for company_ticker in batch:
+                    company_inputs = dict_inputs.pop(company_ticker)
+                    try:
+                        if isinstance(company_inputs, Exception):
+                            raise company_inputs
+                        with use_instrumentation(instrumentation):
+                            df_equity_valuations = value_company(company_ticker, config = config, **company_inputs)
+                        rows = _valuation_rows(company_ticker, df_equity_valuations)
+                    except Exception as error:
+                        rows = _valuation_rows(company_ticker, error = error)
+                    del company_inputs
+
+                    pending_rows += rows
+                    yield pd.DataFrame(rows, columns = VALUATION_COLUMNS)
+
+                if checkpoint_path is not None:
+                    with instrumentation.stage('checkpoint', rows = len(pending_rows)):
+                        _append_checkpoint(checkpoint_path, pending_rows)
+                pending_rows = []
+    finally:
+        # rows already yielded are kept when the consumer stops early or an exception escapes
+        if checkpoint_path is not None and pending_rows:
+            _append_checkpoint(checkpoint_path, pending_rows)
@@ -0,0 +1,229 @@
+import json
+import os
+import threading
+
+import pandas as pd
+import numpy as np
+
+from dcf_calcs import calculate_daily_monthly_returns
+
+# store directory -> lock shared by every PriceStore of that directory (the pipeline opens one store per ticker)
+_store_locks = {}
+_store_locks_lock = threading.Lock()
+
+
+def _store_lock(store_dir):
+    with _store_locks_lock:
+        return _store_locks.setdefault(os.path.realpath(store_dir), threading.Lock())
+
+
+class YahooPriceSource:
+    """
+    Daily close prices off Yahoo using Pandas DataReader (the source of pull_daily_stock_prices())
+    Price sources implement fetch_daily_close(list_of_tickers, start, end) -> DataFrame of close prices (dates x tickers)
+    """
+
+    def fetch_daily_close(self, list_of_tickers, start, end):
+        import pandas_datareader as web
+
+        df_close = web.DataReader(list_of_tickers, 'yahoo', start, end)['Close']
+        if isinstance(df_close, pd.Series):
+            df_close = df_close.to_frame(list_of_tickers[0])
+        return df_close
+
+
+class DataFramePriceSource:
+    """
+    Price source serving close prices from a DataFrame (dates x tickers), e.g. a vendor file or offline test data
+    """
+
+    def __init__(self, df_prices):
+        self.df_prices = df_prices.sort_index()
+
+    def fetch_daily_close(self, list_of_tickers, start, end):
+        columns = [ticker for ticker in list_of_tickers if ticker in self.df_prices.columns]
+        return self.df_prices.loc[pd.Timestamp(start):pd.Timestamp(end), columns]
+
+
+class PriceStore:
+    """
+    Local on-disk store of daily close prices, one pair of raw binary files per ticker:
+        {ticker}.dates - datetime64[D], sorted
+        {ticker}.close - float64
+        {ticker}.meta - json of the first & last date the stored history covers (the start & end asked of the
+            source, may be non-trading days)
+    Files are read as read-only memory maps, so date windows are zero-copy slices of the files
+    update() only pulls the dates after the covered end from the price source & appends them,
+    updates of the same directory are serialized (one lock per directory within the process)
+
+    Inputs: store_dir, source - price source (default = YahooPriceSource())
+    """
+
+    def __init__(self, store_dir, source = None):
+        self.store_dir = store_dir
+        self.source = source if source is not None else YahooPriceSource()
+        self._lock = _store_lock(store_dir)
+        os.makedirs(store_dir, exist_ok = True)
+
+    def _paths(self, ticker):
+        return os.path.join(self.store_dir, f"{ticker}.dates"), os.path.join(self.store_dir, f"{ticker}.close")
+
+    def _meta_path(self, ticker):
+        return os.path.join(self.store_dir, f"{ticker}.meta")
+
+    def _read_meta(self, ticker):
+        if not os.path.exists(self._meta_path(ticker)):
+            return {}
+        with open(self._meta_path(ticker)) as f:
+            return json.load(f)
+
+    def _write_meta(self, ticker, **dates):
+        meta = dict(self._read_meta(ticker), **{key: date.strftime('%Y-%m-%d') for key, date in dates.items()})
+        path_meta = self._meta_path(ticker)
+        with open(f"{path_meta}.tmp", 'w') as f:
+            json.dump(meta, f)
+        os.replace(f"{path_meta}.tmp", path_meta)
+
+    def covered_start(self, ticker):
+        """
+        First date the stored history of a ticker covers, None if nothing is stored
+        (stores written before .meta files existed fall back to the first stored date)
+        """
+        meta = self._read_meta(ticker)
+        if 'start' in meta:
+            return pd.Timestamp(meta['start'])
+        dates, close = self.get_arrays(ticker)
+        return pd.Timestamp(dates[0]) if len(dates) else None
+
+    def covered_end(self, ticker):
+        """
+        Last date the stored history of a ticker covers, None if nothing is stored
+        (falls back to the last stored date)
+        """
+        meta = self._read_meta(ticker)
+        if 'end' in meta:
+            return pd.Timestamp(meta['end'])
+        dates, close = self.get_arrays(ticker)
+        return pd.Timestamp(dates[-1]) if len(dates) else None
+
+    def get_arrays(self, ticker):
+        """
+        Memory-mapped (dates, close) of every stored date of a ticker, empty arrays if nothing is stored
+        """
+        path_dates, path_close = self._paths(ticker)
+        if not os.path.exists(path_dates) or os.path.getsize(path_dates) == 0:
+            return np.array([], dtype = 'datetime64[D]'), np.array([], dtype = float)
+        dates = np.memmap(path_dates, dtype = 'datetime64[D]', mode = 'r')
+        close = np.memmap(path_close, dtype = np.float64, mode = 'r')
+        # close is appended before dates, a partially written append is ignored
+        n = min(len(dates), len(close))
+        return dates[:n], close[:n]
+
+    def get_prices(self, ticker, start = None, end = None):
+        """
+        Zero-copy (dates, close) slices of the stored memory maps for start <= date <= end
+        """
+        dates, close = self.get_arrays(ticker)
+        i_start = 0 if start is None else np.searchsorted(dates, np.datetime64(pd.Timestamp(start), 'D'), side = 'left')
+        i_end = len(dates) if end is None else np.searchsorted(dates, np.datetime64(pd.Timestamp(end), 'D'), side = 'right')
+        return dates[i_start:i_end], close[i_start:i_end]
+
+    def _append(self, ticker, df_close):
+        """
+        Appends close prices & their dates, both files are first cut to their common length so the leftover of an
+        interrupted append (close written, dates not) never shifts later prices onto the wrong dates
+        """
+        path_dates, path_close = self._paths(ticker)
+        df_close = df_close.dropna()
+        if os.path.exists(path_dates) and os.path.exists(path_close):
+            n_bytes = min(os.path.getsize(path_dates), os.path.getsize(path_close))
+            for path in (path_close, path_dates):
+                if os.path.getsize(path) > n_bytes:
+                    os.truncate(path, n_bytes)
+        with open(path_close, 'ab') as f:
+            f.write(df_close.to_numpy(dtype = np.float64).tobytes())
+        with open(path_dates, 'ab') as f:
+            f.write(df_close.index.to_numpy().astype('datetime64[D]').tobytes())
+
+    def _rewrite(self, ticker, df_close):
+        """
+        Replaces the stored history of a ticker: both files are written to temporary paths & moved over the old ones,
+        so readers & interrupted rewrites never see a truncated file
+        """
+        paths = self._paths(ticker)
+        df_close = df_close.dropna()
+        arrays = [df_close.index.to_numpy().astype('datetime64[D]'), df_close.to_numpy(dtype = np.float64)]
+        for path, array in zip(paths, arrays):
+            with open(f"{path}.tmp", 'wb') as f:
+                f.write(array.tobytes())
+        # close is replaced before dates, like appends
+        for path in paths[::-1]:
+            os.replace(f"{path}.tmp", path)
+
+    def update(self, list_of_tickers, start, end):
+        """
+        Makes the store cover start to end for every ticker:
+        - dates after the covered end (covered_end()) are pulled from the source & appended
+        - a start before the covered start (covered_start()) re-pulls & rewrites the ticker
+          (rare, extends history backwards)
+        The covered dates are recorded, so start & end on non-trading days do not pull the same dates again
+        (today & later are never marked covered, their prices may not be published yet)
+        """
+        start, end = pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize()
+        covered_end = min(end, pd.Timestamp.now().normalize() - pd.Timedelta(days = 1))
+
+        with self._lock:
+            list_append, list_rewrite = [], []
+            for ticker in list_of_tickers:
+                dates, close = self.get_arrays(ticker)
+                if len(dates) == 0 or start < self.covered_start(ticker):
+                    list_rewrite.append(ticker)
+                elif end > self.covered_end(ticker):
+                    list_append.append((ticker, self.covered_end(ticker) + pd.Timedelta(days = 1)))
+
+            if list_rewrite:
+                df_close = self.source.fetch_daily_close(list_rewrite, start, end)
+                for ticker in list_rewrite:
+                    if ticker in df_close.columns:
+                        stored_dates, stored_close = self.get_arrays(ticker)
+                        df_stored = pd.Series(np.array(stored_close), index = pd.DatetimeIndex(np.array(stored_dates)))
+                        df_ticker = df_close[ticker].dropna()
+                        df_ticker = pd.concat([df_ticker, df_stored[df_stored.index > df_ticker.index.max()]])
+                        previous_end = self.covered_end(ticker) if len(stored_dates) else None
+                        self._rewrite(ticker, df_ticker)
+                        self._write_meta(
+                            ticker, start = start,
+                            end = covered_end if previous_end is None else max(covered_end, previous_end)
+                        )
+
+            # one source request per distinct first missing date (all tickers updated together share it)
+            dict_append_starts = {}
+            for ticker, append_start in list_append:
+                dict_append_starts.setdefault(append_start, []).append(ticker)
+            for append_start, tickers in dict_append_starts.items():
+                df_close = self.source.fetch_daily_close(tickers, append_start, end)
+                for ticker in tickers:
+                    if ticker in df_close.columns:
+                        self._append(ticker, df_close[ticker].loc[append_start:])
+                        if covered_end >= append_start:
+                            self._write_meta(ticker, end = covered_end)
+
+    def get_price_frame(self, list_of_tickers, start = None, end = None):
+        """
+        Close prices of many tickers aligned on dates (dates x tickers), same layout as pull_daily_stock_prices()
+        """
+        dict_close = {}
+        for ticker in list_of_tickers:
+            dates, close = self.get_prices(ticker, start, end)
+            dict_close[ticker] = pd.Series(close, index = pd.DatetimeIndex(dates), copy = False)
+        df_prices = pd.concat(dict_close, axis = 1)
+        df_prices.index.name = 'Date'
+        return df_prices
+
+    def get_returns(self, list_of_tickers, start = None, end = None):
+        """
+        Daily prices, daily returns & monthly returns from the stored arrays (outputs of pull_daily_stock_prices())
+        """
+        df_dailyStockPrices = self.get_price_frame(list_of_tickers, start, end)
+        df_dailyReturn, df_monthlyReturn = calculate_daily_monthly_returns(df_dailyStockPrices)
+        return df_dailyStockPrices, df_dailyReturn, df_monthlyReturn
@@ -0,0 +1,221 @@
+import numpy as np
+import pandas as pd
+
+from dcf_kernel import DCF_INPUT_DTYPE, value_records
+
+# inputs a reverse DCF can solve for -> default search interval, None = derived from the other rate of the record
+# (WACC has to stay above the perpetual growth rate & vice versa for a finite terminal value)
+IMPLIED_INPUTS = {
+    'growth_rate': (-0.5, 1.0),
+    'wacc': (None, 1.0),
+    'growth_rate_perpetuity': (-0.5, None),
+}
+
+# distance kept from wacc = growth_rate_perpetuity, where the terminal value is infinite
+TERMINAL_MARGIN = 1e-6
+
+
+def _record_fields(records):
+    """
+    Inputs of the price function per record: forecast coefficients, WACC & equity bridge
+    """
+    net_income, depr_amort, inventory, ppe, net_receivables, payables = records['fcf_ratios'].T
+    working_cap = net_receivables + payables + inventory
+    return {
+        'base_revenue': records['base_revenue'],
+        'growth_rate': records['growth_rate'],
+        # FCF(t) = a * Revenue(t) + b * Revenue(t-1), see dcf_kernel._value_records_numpy()
+        'a': net_income - ppe - working_cap,
+        'b': ppe + working_cap - depr_amort,
+        'growth_rate_perpetuity': records['growth_rate_perpetuity'],
+        'net_cash': records['cashAndCashEquivalents'] - records['total_debt'],
+        'numShares': records['numShares'],
+    }
+
+
+def implied_stock_prices(fields, n_years, skip_years, growth_rate, wacc, growth_rate_perpetuity):
+    """
+    estimate_stock_price of value_records() (one outlook) as a function of growth, WACC & perpetual growth arrays
+    fields - dict of per record arrays of _record_fields(), every array is (records,)
+    """
+    growth_factors = 1 + growth_rate
+    # revenue of the year before each forecast year & FCF of each forecast year, shaped (records, years)
+    revenue_previous = fields['base_revenue'][:, None] * growth_factors[:, None]**np.arange(n_years)
+    fcf = revenue_previous * (fields['a'] * growth_factors + fields['b'])[:, None]
+
+    n_discounted = n_years - skip_years
+    discount_factors = (1 + wacc[:, None])**-np.arange(n_discounted, dtype = float)
+    npv_FCFF = (fcf[:, skip_years:] * discount_factors).sum(axis = 1)
+    terminal_value_discounted = (
+        fcf[:, -1] * (1 + growth_rate_perpetuity)/(wacc - growth_rate_perpetuity)/(1 + wacc)**n_discounted
+    )
+    return (npv_FCFF + terminal_value_discounted + fields['net_cash'])/fields['numShares']
+
+
+def _bracket(solve_for, bracket, growth_rate_perpetuity, wacc, n):
+    """
+    Lower & upper bound of the search interval of every record
+    """
+    low, high = IMPLIED_INPUTS[solve_for] if bracket is None else bracket
+    if low is None:
+        low = growth_rate_perpetuity + TERMINAL_MARGIN
+    if high is None:
+        high = wacc - TERMINAL_MARGIN
+    low = np.broadcast_to(np.asarray(low, dtype = float), n).copy()
+    high = np.broadcast_to(np.asarray(high, dtype = float), n).copy()
+    return low, high
+
+
+def solve_implied(
+    records, stock_prices, solve_for = 'growth_rate', n_years = 6, skip_years = 1, outlook_shift = 0.0,
+    method = 'newton', bracket = None, grid_points = 21, rtol = 1e-10, xtol = 1e-12, max_iterations = 100,
+    spread_table = None
+):
+    """
+    Reverse DCF: the growth rate, WACC or perpetual growth rate at which value_records() prices every record at its
+    market stock price, solved for all records at once (every iteration is one array operation over the records
+    that have not converged yet)
+
+    Inputs:
+        records - structured array of dcf_kernel.DCF_INPUT_DTYPE, e.g. from record_from_financials()
+        stock_prices - market price per record, e.g. stockPrice of the latest Company Market Characteristics row
+        solve_for:
+            'growth_rate' - implied revenue growth (the record's WACC & perpetual growth are kept)
+            'wacc' - implied discount rate (replaces the synthetic rating/CAPM WACC of the record)
+            'growth_rate_perpetuity' - implied terminal growth (the record's WACC is kept)
+        n_years, skip_years - forecast horizon as in value_records()
+        outlook_shift - shift added to the growth rate (0 = neutral outlook)
+        method:
+            'newton' - Newton steps (numerical derivative) kept inside the bracket, bisection where a step leaves it
+            'bisection' - halves the bracket every iteration (slower, never depends on the derivative)
+        bracket - (low, high) search interval, scalars or arrays per record (default IMPLIED_INPUTS)
+        grid_points - prices evaluated across the interval to find the sign change closest to the record's own rate
+        rtol - converged when |price - stock_price| <= rtol * |stock_price|
+        xtol - or when the bracket is narrower than xtol
+        max_iterations - records still apart after this many iterations are not converged
+        spread_table - synthetic rating table of the records' WACC, see dcf_credit.get_spread_table()
+
+    Returns dict of arrays (one entry per record):
+        value - implied growth rate / WACC / perpetual growth (NaN where the interval has no solution)
+        converged - bool mask of records solved within rtol/xtol
+        bracketed - bool mask of records whose interval holds a sign change (False = no solution in the interval,
+            e.g. a price above every price the interval reaches, or missing inputs)
+        iterations - iterations each record needed
+        price - estimate_stock_price at value
+    """
+    if solve_for not in IMPLIED_INPUTS:
+        raise ValueError(f"Unknown input to solve for: {solve_for}, expected one of {list(IMPLIED_INPUTS)}")
+    if method not in ('newton', 'bisection'):
+        raise ValueError(f"Unknown method: {method}")
+
+    records = np.asarray(records, dtype = DCF_INPUT_DTYPE).reshape(-1)
+    n = len(records)
+    stock_prices = np.broadcast_to(np.asarray(stock_prices, dtype = float), n)
+    fields = _record_fields(records)
+    fields['growth_rate'] = fields['growth_rate'] + outlook_shift
+
+    # WACC of the records (synthetic rating, CAPM & tax rate as in value_company())
+    wacc = value_records(
+        records, n_years = n_years, skip_years = skip_years, outlook_shifts = [outlook_shift], engine = 'numpy',
+        spread_table = spread_table
+    )['wacc'][:, 0]
+    rates = {
+        'growth_rate': fields['growth_rate'], 'wacc': wacc, 'growth_rate_perpetuity': fields['growth_rate_perpetuity']
+    }
+
+    def price_error(x, index):
+        inputs = {name: rate[index] for name, rate in rates.items()}
+        inputs[solve_for] = x
+        with np.errstate(divide = 'ignore', invalid = 'ignore', over = 'ignore'):
+            prices = implied_stock_prices(
+                {name: field[index] for name, field in fields.items()}, n_years, skip_years, **inputs
+            )
+        return prices - stock_prices[index]
+
+    # the price is not monotonic in every input (e.g. growth when FCF falls with reinvestment), so the interval is
+    # scanned on a grid plus the record's own rate first & each record keeps the sign change closest to its own rate
+    low, high = _bracket(solve_for, bracket, rates['growth_rate_perpetuity'], wacc, n)
+    grid = low[:, None] + (high - low)[:, None] * np.linspace(0, 1, grid_points)
+    grid = np.sort(np.column_stack([grid, np.clip(rates[solve_for], low, high)]), axis = 1)
+    grid_errors = price_error(grid.ravel(), np.repeat(np.arange(n), grid_points + 1)).reshape(n, grid_points + 1)
+    grid_roots = np.abs(grid_errors) <= rtol * np.abs(stock_prices)[:, None]
+    sign_changes = (np.sign(grid_errors[:, :-1]) * np.sign(grid_errors[:, 1:]) <= 0) | grid_roots[:, :-1]
+    bracketed = (low < high) & sign_changes.any(axis = 1)
+    if solve_for == 'growth_rate':
+        # no finite terminal value at any growth rate
+        bracketed &= wacc > rates['growth_rate_perpetuity']
+
+    # distance of the root (grid point or interval midpoint) to the record's own rate
+    own_rate = rates[solve_for][:, None]
+    distances = np.abs(np.where(grid_roots[:, :-1], grid[:, :-1], (grid[:, :-1] + grid[:, 1:])/2) - own_rate)
+    distances[~sign_changes] = np.inf
+    k = np.argmin(distances, axis = 1)
+    all_records = np.arange(n)
+    low, high, error_low = grid[all_records, k], grid[all_records, k + 1], grid_errors[all_records, k]
+
+    value = np.full(n, np.nan)
+    converged = np.zeros(n, dtype = bool)
+    iterations = np.zeros(n, dtype = np.int64)
+
+    # records priced at a grid point are solved already
+    on_grid = bracketed & grid_roots[all_records, k]
+    value[on_grid] = low[on_grid]
+    converged[on_grid] = True
+
+    # start from the record's own rate where it lies in the interval
+    x = np.where((rates[solve_for] > low) & (rates[solve_for] < high), rates[solve_for], (low + high)/2)
+    active = np.flatnonzero(bracketed & ~on_grid)
+    x = x[active]
+    for iteration in range(1, max_iterations + 1):
+        if not len(active):
+            break
+        error = price_error(x, active)
+        iterations[active] = iteration
+
+        # narrow the bracket around the root: x replaces the bound whose error has the same sign
+        same_as_low = np.sign(error) == np.sign(error_low[active])
+        low[active] = np.where(same_as_low, x, low[active])
+        error_low[active] = np.where(same_as_low, error, error_low[active])
+        high[active] = np.where(same_as_low, high[active], x)
+
+        done = (np.abs(error) <= rtol * np.abs(stock_prices[active])) | (high[active] - low[active] <= xtol)
+        value[active[done]] = x[done]
+        converged[active[done]] = True
+
+        active, x, error = active[~done], x[~done], error[~done]
+        midpoint = (low[active] + high[active])/2
+        if method == 'bisection' or not len(active):
+            x = midpoint
+            continue
+
+        step = np.maximum(1e-7, 1e-7 * np.abs(x))
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            x_newton = x - error * step/(price_error(x + step, active) - error)
+        inside = (x_newton > low[active]) & (x_newton < high[active])
+        x = np.where(inside, x_newton, midpoint)
+
+    # best estimate of records that ran out of iterations
+    value[active] = x
+
+    price = np.full(n, np.nan)
+    solved = np.flatnonzero(~np.isnan(value))
+    price[solved] = price_error(value[solved], solved) + stock_prices[solved]
+
+    return {'value': value, 'converged': converged, 'bracketed': bracketed, 'iterations': iterations, 'price': price}
+
+
+def implied_values(
+    tickers, records, stock_prices, solve_for = ('growth_rate', 'wacc', 'growth_rate_perpetuity'), **solver_kwargs
+):
+    """
+    Runs solve_implied() for each input of solve_for
+    Returns dataframe indexed by ticker: stock_price, implied_<input> & converged_<input> per input
+    """
+    df_implied = pd.DataFrame(
+        {'stock_price': np.asarray(stock_prices, dtype = float)}, index = pd.Index(tickers, name = 'ticker')
+    )
+    for name in solve_for:
+        result = solve_implied(records, stock_prices, solve_for = name, **solver_kwargs)
+        df_implied[f"implied_{name}"] = result['value']
+        df_implied[f"converged_{name}"] = result['converged']
+    return df_implied
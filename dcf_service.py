@@ -0,0 +1,448 @@
+import json
+import math
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+
+from dcf_calcs import (
+    calculate_historical_free_cash_flows,
+    calculate_ratio_of_FCF_components_to_revenue,
+    calculate_sensitivity_grid,
+)
+from dcf_credit import DEFAULT_SPREAD_TABLE, SPREAD_TABLES
+from dcf_kernel import DCF_INPUT_DTYPE, DCF_OUTPUT_DTYPE, record_from_financials, value_records
+from dcf_pipeline import build_config, build_fmp_client, fetch_company_inputs, trim_company_financials
+from dcf_instrumentation import NOOP, set_instrumentation
+
+# config keys the cached analytics of a ticker (historical FCF, ratios, growth, beta) depend on
+# (index_ticker is fixed per service, the data source's daily returns & the cached inputs are pulled against it)
+ANALYTICS_CONFIG_KEYS = ['growth_method', 'ratio_year_set']
+
+# config keys a request may override: analytics keys & the keys applied when valuing
+REQUEST_CONFIG_KEYS = ANALYTICS_CONFIG_KEYS + [
+    'forecast_years', 'risk_free_rate', 'growth_rate_perpetuity', 'spread_table'
+]
+
+# record fields a scenario may override
+SCENARIO_FIELDS = [name for name in DCF_INPUT_DTYPE.names if name != 'fcf_ratios']
+
+STATEMENT_INPUTS = ['df_incomeStatement', 'df_balanceSheet', 'df_statementCashFlows', 'df_stockCharacteristics']
+
+
+class LRUCache:
+    """
+    Thread-safe dict keeping the max_items most recently used entries, counts hits & misses
+    """
+
+    def __init__(self, max_items):
+        self.max_items = max_items
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, count = True):
+        """
+        Returns (True, value) on a hit, (False, None) on a miss (counted in hits/misses if count)
+        """
+        with self._lock:
+            if key in self._items:
+                self.hits += count
+                self._items.move_to_end(key)
+                return True, self._items[key]
+            self.misses += count
+            return False, None
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last = False)
+
+    def stats(self):
+        with self._lock:
+            return {'items': len(self._items), 'max_items': self.max_items, 'hits': self.hits, 'misses': self.misses}
+
+
+class FMPDataSource:
+    """
+    Pulls a company's valuation inputs (financials & daily returns) with one shared dcf_fetch.FMPClient
+    Data sources implement fetch_company_inputs(company_ticker) -> keyword inputs of value_company()
+    """
+
+    def __init__(self, config):
+        self.config = build_config(config)
+        self._client = None
+        self._lock = threading.Lock()
+
+    def fetch_company_inputs(self, company_ticker):
+        with self._lock:
+            if self._client is None:
+                self._client = build_fmp_client(self.config)
+        company_inputs = fetch_company_inputs(company_ticker, self.config, client = self._client)
+
+        # only the line-items the valuation reads are kept warm
+        company_financials = trim_company_financials([company_inputs[name] for name in STATEMENT_INPUTS])
+        company_inputs.update(zip(STATEMENT_INPUTS, company_financials))
+        return company_inputs
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+
+
+class StaticDataSource:
+    """
+    Serves valuation inputs from memory, for offline use & tests (e.g. dcf_synthetic data)
+    Inputs: dict of ticker -> (df_IS, df_BS, df_CF, df_SC), daily returns of the tickers & the index (dates x tickers),
+    index_ticker
+    """
+
+    def __init__(self, dict_company_financials, df_dailyReturn, index_ticker = 'SPY'):
+        self.dict_company_financials = dict_company_financials
+        self.df_dailyReturn = df_dailyReturn
+        self.index_ticker = index_ticker
+        self.calls = 0
+
+    def fetch_company_inputs(self, company_ticker):
+        self.calls += 1
+        if company_ticker not in self.dict_company_financials:
+            raise KeyError(f"Unknown ticker: {company_ticker}")
+
+        company_inputs = dict(zip(STATEMENT_INPUTS, self.dict_company_financials[company_ticker]))
+        company_inputs['df_dailyReturn'] = self.df_dailyReturn[[self.index_ticker, company_ticker]].dropna()
+        return company_inputs
+
+    def close(self):
+        pass
+
+
+def _json_safe(value):
+    """
+    Converts numpy values to JSON types, NaN & infinity to None (not valid JSON)
+    """
+    if isinstance(value, dict):
+        return {key: _json_safe(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_json_safe(item) for item in value]
+    if isinstance(value, np.ndarray):
+        return _json_safe(value.tolist())
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+class ValuationService:
+    """
+    Serves DCF valuations of many tickers with warm in-memory caches, see make_server() for the HTTP interface
+    - inputs: financials & daily returns per ticker (max_tickers most recently used)
+    - analytics: historical FCF, FCF ratios, growth, beta & the dcf_kernel input record per ticker & config
+    Concurrent requests for the same ticker share one fetch/computation (request coalescing)
+    Valuations use dcf_kernel.value_records() (same results as value_company()), sensitivity tables
+    dcf_calcs.calculate_sensitivity_grid()
+
+    Inputs: config dict (see dcf_pipeline.DEFAULT_CONFIG), data_source - object with
+    fetch_company_inputs(ticker) (default = FMPDataSource(config), StaticDataSource for offline use), max_tickers
+    """
+
+    def __init__(self, config = None, data_source = None, max_tickers = 256):
+        self.config = build_config(config)
+        self.data_source = data_source if data_source is not None else FMPDataSource(self.config)
+        self.inputs = LRUCache(max_tickers)
+        self.analytics = LRUCache(max_tickers)
+        self.coalesced = 0
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def _coalesce(self, key, compute):
+        """
+        Runs compute() once for all concurrent callers of the same key, every caller gets its result or exception
+        """
+        with self._lock:
+            future = self._in_flight.get(key)
+            is_owner = future is None
+            if is_owner:
+                future = self._in_flight[key] = Future()
+            else:
+                self.coalesced += 1
+
+        if is_owner:
+            try:
+                future.set_result(compute())
+            except Exception as error:
+                future.set_exception(error)
+            finally:
+                with self._lock:
+                    del self._in_flight[key]
+        return future.result()
+
+    def _cached(self, cache, key, compute):
+        hit, value = cache.get(key)
+        if hit:
+            return value
+
+        def compute_and_store():
+            # another request may have stored it between the miss & becoming the owner
+            hit, value = cache.get(key, count = False)
+            if hit:
+                return value
+            value = compute()
+            cache.put(key, value)
+            return value
+        return self._coalesce((id(cache), key), compute_and_store)
+
+    def company_inputs(self, company_ticker):
+        """
+        Financials & daily returns of the ticker (fetched once while warm)
+        """
+        return self._cached(
+            self.inputs, company_ticker, lambda: self.data_source.fetch_company_inputs(company_ticker)
+        )
+
+    def _request_config(self, overrides):
+        unknown = [key for key in overrides if key not in REQUEST_CONFIG_KEYS]
+        if unknown:
+            raise ValueError(f"Unknown config keys: {unknown}")
+        # built-in tables only, requests must not make the server read local files
+        spread_table = overrides.get('spread_table', DEFAULT_SPREAD_TABLE)
+        if spread_table not in SPREAD_TABLES:
+            raise ValueError(f"Unknown spread table: {spread_table}, expected one of {list(SPREAD_TABLES)}")
+        return dict(self.config, **overrides)
+
+    def company_analytics(self, company_ticker, config):
+        """
+        Historical FCF, FCF ratios & dcf_kernel input record (growth, beta, ...) of the ticker under the config
+        """
+        key = (company_ticker, tuple(config[name] for name in ANALYTICS_CONFIG_KEYS))
+
+        def compute():
+            company_inputs = self.company_inputs(company_ticker)
+            df_incomeStatement = company_inputs['df_incomeStatement']
+            latest_year = df_incomeStatement.index.max()
+
+            df_fcf = calculate_historical_free_cash_flows(df_incomeStatement, company_inputs['df_balanceSheet'])
+            ratio_year_set = latest_year if config['ratio_year_set'] == 'latest' else config['ratio_year_set']
+            return {
+                'latest_year': latest_year,
+                'stockPrice': company_inputs['df_stockCharacteristics'].loc[latest_year, 'stockPrice'],
+                'df_fcf': df_fcf,
+                'df_fcf_ratios': calculate_ratio_of_FCF_components_to_revenue(df_fcf, ratio_year_set = ratio_year_set),
+                'record': record_from_financials(company_ticker, config = config, **company_inputs),
+            }
+        return self._cached(self.analytics, key, compute)
+
+    def _records(self, record, config, n):
+        """
+        n copies of the cached record with the request's risk free rate & perpetual growth
+        """
+        records = np.empty(n, dtype = DCF_INPUT_DTYPE)
+        records[:] = record
+        records['risk_free_rate'] = config['risk_free_rate']
+        records['growth_rate_perpetuity'] = config['growth_rate_perpetuity']
+        return records
+
+    def _value(self, records, config):
+        return value_records(
+            records, n_years = config['forecast_years'] + 1, skip_years = 1, outlook_shifts = config['outlook_shifts'],
+            spread_table = config['spread_table']
+        )
+
+    def _valuation_rows(self, valuations):
+        return [
+            dict(outlook = outlook, **{name: valuation[name] for name in DCF_OUTPUT_DTYPE.names})
+            for outlook, valuation in zip(self.config['outlook_shifts'], valuations)
+        ]
+
+    def valuation(self, company_ticker, **config_overrides):
+        """
+        Valuation of the ticker per outlook & its inputs
+        config_overrides - REQUEST_CONFIG_KEYS
+        """
+        config = self._request_config(config_overrides)
+        analytics = self.company_analytics(company_ticker, config)
+        records = self._records(analytics['record'], config, 1)
+
+        return _json_safe({
+            'ticker': company_ticker,
+            'calendarYear': analytics['latest_year'],
+            'stockPrice': analytics['stockPrice'],
+            'inputs': {name: records[name][0] for name in DCF_INPUT_DTYPE.names},
+            'valuations': self._valuation_rows(self._value(records, config)[0]),
+        })
+
+    def sensitivity(self, company_ticker, wacc_values, growth_rate_perpetuity_values, growth_rate_values = None,
+                    **config_overrides):
+        """
+        WACC x perpetual growth x revenue growth table (calculate_sensitivity_grid()) of the ticker
+        growth_rate_values default to the ticker's estimated growth rate
+        """
+        config = self._request_config(config_overrides)
+        analytics = self.company_analytics(company_ticker, config)
+        record = analytics['record']
+        latest_year = analytics['latest_year']
+
+        if growth_rate_values is None:
+            growth_rate_values = [record['growth_rate']]
+
+        df_grid = calculate_sensitivity_grid(
+            df_fcf = analytics['df_fcf'],
+            df_fcf_ratios = analytics['df_fcf_ratios'],
+            list_years_to_forecast_temp = list(range(latest_year, latest_year + config['forecast_years'] + 1)),
+            wacc_values = wacc_values,
+            growth_rate_perpetuity_values = growth_rate_perpetuity_values,
+            growth_rate_values = growth_rate_values,
+            cashAndCashEquivalents = record['cashAndCashEquivalents'],
+            totalDebt = record['total_debt'],
+            numShares = record['numShares'],
+            forecast_start_year = latest_year + 1
+        )
+        return _json_safe({'ticker': company_ticker, 'grid': df_grid.reset_index().to_dict('records')})
+
+    def scenarios(self, company_ticker, scenarios, **config_overrides):
+        """
+        Valuations of the ticker under changed inputs, all scenarios are valued in one dcf_kernel call
+        scenarios - list of dicts of SCENARIO_FIELDS -> value (e.g. {'name': 'recession', 'growth_rate': -0.02}),
+            risk_free_rate & growth_rate_perpetuity of a scenario replace the config values
+        """
+        config = self._request_config(config_overrides)
+        record = self.company_analytics(company_ticker, config)['record']
+
+        records = self._records(record, config, len(scenarios))
+        for i, scenario in enumerate(scenarios):
+            for name, value in scenario.items():
+                if name == 'name':
+                    continue
+                if name not in SCENARIO_FIELDS:
+                    raise ValueError(f"Unknown scenario field: {name}")
+                records[name][i] = value
+
+        valuations = self._value(records, config)
+        return _json_safe({
+            'ticker': company_ticker,
+            'scenarios': [
+                {'name': scenario.get('name', i), 'inputs': scenario, 'valuations': self._valuation_rows(valuations[i])}
+                for i, scenario in enumerate(scenarios)
+            ],
+        })
+
+    def stats(self):
+        return {'inputs': self.inputs.stats(), 'analytics': self.analytics.stats(), 'coalesced': self.coalesced}
+
+    def close(self):
+        self.data_source.close()
+
+
+def _parse_values(text):
+    return [float(value) for value in text.split(',')]
+
+
+def _parse_config_overrides(query):
+    overrides = {}
+    for key, values in query.items():
+        if key == 'spread_table':
+            overrides[key] = values[0]
+        elif key in ('growth_method', 'ratio_year_set'):
+            overrides[key] = int(values[0]) if values[0].isdigit() else values[0]
+        elif key == 'forecast_years':
+            overrides[key] = int(values[0])
+        elif key in ('growth_rate_perpetuity', 'risk_free_rate'):
+            overrides[key] = float(values[0])
+        else:
+            raise ValueError(f"Unknown parameter: {key}")
+    return overrides
+
+
+class ValuationRequestHandler(BaseHTTPRequestHandler):
+    """
+    GET  /valuation?ticker=AAPL[&risk_free_rate=0.03&forecast_years=5...]
+    GET  /sensitivity?ticker=AAPL&wacc=0.07,0.08,0.09&growth_rate_perpetuity=0.01,0.02[&growth_rate=0.03,0.05]
+    POST /scenarios  {"ticker": "AAPL", "scenarios": [{"name": "recession", "growth_rate": -0.02}, ...]}
+    GET  /stats
+    Responses are JSON, errors {"error": "<type>: <message>"} with status 400 (bad request) or 500
+    """
+
+    service = None
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self, respond):
+        try:
+            status, payload = respond()
+        except (ValueError, KeyError, TypeError) as error:
+            status, payload = 400, {'error': f"{type(error).__name__}: {error}"}
+        except Exception as error:
+            status, payload = 500, {'error': f"{type(error).__name__}: {error}"}
+        self._send_json(status, payload)
+
+    def do_GET(self):
+        def respond():
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            if url.path == '/stats':
+                return 200, self.service.stats()
+            if url.path not in ('/valuation', '/sensitivity'):
+                return 404, {'error': f"Unknown path: {url.path}"}
+
+            company_ticker = query.pop('ticker')[0]
+            if url.path == '/valuation':
+                return 200, self.service.valuation(company_ticker, **_parse_config_overrides(query))
+
+            wacc_values = _parse_values(query.pop('wacc')[0])
+            growth_rate_perpetuity_values = _parse_values(query.pop('growth_rate_perpetuity')[0])
+            growth_rate_values = _parse_values(query.pop('growth_rate')[0]) if 'growth_rate' in query else None
+            return 200, self.service.sensitivity(
+                company_ticker, wacc_values, growth_rate_perpetuity_values, growth_rate_values,
+                **_parse_config_overrides(query)
+            )
+        self._handle(respond)
+
+    def do_POST(self):
+        def respond():
+            url = urlparse(self.path)
+            if url.path != '/scenarios':
+                return 404, {'error': f"Unknown path: {url.path}"}
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            return 200, self.service.scenarios(request['ticker'], request['scenarios'], **request.get('config', {}))
+        self._handle(respond)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(service, host = '127.0.0.1', port = 8000):
+    """
+    HTTP server of a ValuationService (one thread per request), run with server.serve_forever()
+    The dcf_calcs stage results are not printed while serving (instrumentation switched to NOOP)
+    """
+    set_instrumentation(NOOP)
+    handler = type('BoundValuationRequestHandler', (ValuationRequestHandler,), {'service': service})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description = 'Local DCF valuation service')
+    parser.add_argument('--host', default = '127.0.0.1')
+    parser.add_argument('--port', type = int, default = 8000)
+    parser.add_argument('--max-tickers', type = int, default = 256, help = 'tickers kept warm in memory')
+    args = parser.parse_args()
+
+    from creds import api
+
+    server = make_server(ValuationService({'api': api}, max_tickers = args.max_tickers), args.host, args.port)
+    print(f"Serving DCF valuations on http://{args.host}:{args.port}")
+    server.serve_forever()
@@ -0,0 +1,210 @@
+import numpy as np
+import pandas as pd
+
+from dcf_calcs import PANEL_COLUMNS
+from dcf_pipeline import VALUATION_LINE_ITEMS
+
+# statement codes in the order of pull_company_financials()
+STATEMENTS = ('IS', 'BS', 'CF', 'SC')
+
+# line-items kept by default: the numeric VALUATION_LINE_ITEMS (the period end dates are kept separately)
+DEFAULT_STATEMENT_FIELDS = {
+    statement: [item for item in line_items if item not in ('date', 'datetime')]
+    for statement, line_items in VALUATION_LINE_ITEMS.items()
+}
+
+# layout tuple -> the first equal layout tuple (shared by every FinancialStatements with that layout)
+_LAYOUTS = {}
+# layout tuple -> dict of (statement, item) -> row of values
+_LAYOUT_ROWS = {}
+
+
+def _layout(fields):
+    """
+    Returns the shared layout tuple of (statement, item) rows for a dict of statement code -> line-items
+    """
+    unknown = [statement for statement in fields if statement not in STATEMENTS]
+    if unknown:
+        raise ValueError(f"Unknown statements: {unknown}, expected some of {list(STATEMENTS)}")
+
+    layout = tuple((statement, item) for statement in STATEMENTS for item in fields.get(statement, []))
+    if layout not in _LAYOUTS:
+        _LAYOUTS[layout] = layout
+        _LAYOUT_ROWS[layout] = {field: row for row, field in enumerate(layout)}
+    return _LAYOUTS[layout]
+
+
+class FinancialStatements:
+    """
+    Financials of one company kept as a handful of numpy arrays instead of 4 dataframes of every FMP column
+    (30 years of the default fields take ~4.5KB of arrays, 5,000 tickers x 30 years ~30MB)
+
+    ticker - company ticker
+    years - int16 calendar years, oldest first
+    dates - datetime64[D] Income Statement period ends (NaT for years without an Income Statement)
+    values - float64 array shaped (fields, years), one row per (statement, item) of the layout (NaN = not reported)
+    present - bool array shaped (statements, years), whether a statement has a row for the year
+    layout - tuple of (statement, item) of the rows of values, shared by all instances loaded with the same fields
+
+    Usage:
+        statements = FinancialStatements.from_dataframes('AAPL', pull_company_financials('AAPL', 10, api))
+        statements.get('revenue')
+        df_IS, df_BS, df_CF, df_SC = statements.to_dataframes()
+    """
+
+    __slots__ = ('ticker', 'years', 'dates', 'values', 'present', 'layout')
+
+    def __init__(self, ticker, years, dates, values, present, layout):
+        self.ticker = ticker
+        self.years = years
+        self.dates = dates
+        self.values = values
+        self.present = present
+        self.layout = layout
+
+    @classmethod
+    def from_dataframes(cls, ticker, company_financials, fields = None):
+        """
+        Converts the output of pull_company_financials() (4 dataframes indexed by calendarYear)
+        fields - dict of statement code -> line-items to keep (default DEFAULT_STATEMENT_FIELDS),
+        line-items a statement does not report are kept as NaN
+        """
+        layout = _layout(DEFAULT_STATEMENT_FIELDS if fields is None else fields)
+
+        statement_years = [np.asarray(df_statement.index, dtype = np.int64) for df_statement in company_financials]
+        years = np.unique(np.concatenate(statement_years))
+        positions = [np.searchsorted(years, calendar_years) for calendar_years in statement_years]
+
+        present = np.zeros((len(STATEMENTS), len(years)), dtype = bool)
+        for i, statement_positions in enumerate(positions):
+            present[i, statement_positions] = True
+
+        values = np.full((len(layout), len(years)), np.nan)
+        for row, (statement, item) in enumerate(layout):
+            i = STATEMENTS.index(statement)
+            df_statement = company_financials[i]
+            if item in df_statement.columns:
+                values[row, positions[i]] = df_statement[item].to_numpy(dtype = float)
+
+        dates = np.full(len(years), np.datetime64('NaT'), dtype = 'datetime64[D]')
+        df_IS = company_financials[0]
+        if 'datetime' in df_IS.columns:
+            dates[positions[0]] = df_IS['datetime'].to_numpy(dtype = 'datetime64[D]')
+        elif 'date' in df_IS.columns:
+            dates[positions[0]] = pd.to_datetime(df_IS['date']).to_numpy(dtype = 'datetime64[D]')
+
+        return cls(ticker, years.astype(np.int16), dates, values, present, layout)
+
+    def to_dataframes(self):
+        """
+        Converts back to the layout of pull_company_financials(): Income Statement, Balance Sheet,
+        Statement of Cash Flows & Company Market Characteristics indexed by calendarYear (newest first)
+        with the fields of the layout (the Income Statement also gets date & datetime)
+        """
+        rows = _LAYOUT_ROWS[self.layout]
+        list_df_statements = []
+        for i, statement in enumerate(STATEMENTS):
+            year_positions = np.flatnonzero(self.present[i])[::-1]
+            columns = {}
+            if statement == 'IS':
+                datetimes = pd.to_datetime(self.dates[year_positions]).as_unit('ns')
+                columns['date'] = datetimes.strftime('%Y-%m-%d')
+                columns['datetime'] = datetimes
+            for field, row in rows.items():
+                if field[0] == statement:
+                    columns[field[1]] = self.values[row, year_positions]
+            list_df_statements.append(pd.DataFrame(
+                columns, index = pd.Index(self.years[year_positions].astype(np.int64), name = 'calendarYear')
+            ))
+        return tuple(list_df_statements)
+
+    def get(self, item, statement = None):
+        """
+        Values of a line-item per year (oldest first, a view of values)
+        statement - statement code, needed only for line-items kept from several statements (default = first one)
+        """
+        if statement is not None:
+            return self.values[_LAYOUT_ROWS[self.layout][(statement, item)]]
+        for row, field in enumerate(self.layout):
+            if field[1] == item:
+                return self.values[row]
+        raise KeyError(item)
+
+    @property
+    def latest_year(self):
+        return int(self.years[self.present[0]].max())
+
+    @property
+    def nbytes(self):
+        """
+        Bytes of the arrays (the layout tuple is shared & not counted)
+        """
+        return self.years.nbytes + self.dates.nbytes + self.values.nbytes + self.present.nbytes
+
+    def __repr__(self):
+        return (
+            f"FinancialStatements({self.ticker!r}, years = {self.years.min() if len(self.years) else None}-"
+            f"{self.years.max() if len(self.years) else None}, fields = {len(self.layout)})"
+        )
+
+
+def load_financial_statements(tickers, years, api, client = None, fields = None):
+    """
+    Pulls the financials of many tickers (like pull_many_company_financials()) and keeps each ticker as
+    FinancialStatements, the pulled dataframes of a ticker are dropped as soon as it is converted
+    fields - dict of statement code -> line-items to keep (default DEFAULT_STATEMENT_FIELDS)
+    Returns dict of ticker -> FinancialStatements or the exception raised while pulling/parsing that ticker
+    """
+    from dcf_fetch import FMPClient
+    from dcf_calcs import parse_company_financials
+
+    if client is None:
+        with FMPClient(api) as client:
+            raw_statements = client.fetch_many(tickers, years)
+    else:
+        raw_statements = client.fetch_many(tickers, years)
+
+    dict_statements = {}
+    for company_ticker in list(raw_statements):
+        statements = raw_statements.pop(company_ticker)
+        try:
+            if isinstance(statements, Exception):
+                raise statements
+            dict_statements[company_ticker] = FinancialStatements.from_dataframes(
+                company_ticker, parse_company_financials(statements), fields = fields
+            )
+        except Exception as error:
+            dict_statements[company_ticker] = error
+    return dict_statements
+
+
+def statements_to_panel(dict_statements):
+    """
+    Same panel as build_financials_panel() (line-items of PANEL_COLUMNS indexed by (ticker, calendarYear),
+    years the Income Statement, Balance Sheet & Statement of Cash Flows all report) built from FinancialStatements
+    with one array concatenation instead of a dataframe per company & statement
+    Input: dict of ticker -> FinancialStatements (exceptions are skipped)
+    """
+    panel_fields = [(statement, item) for statement, items in PANEL_COLUMNS.items() for item in items]
+    panel_statements = [STATEMENTS.index(statement) for statement in PANEL_COLUMNS]
+
+    list_tickers, list_years, list_values = [], [], []
+    for company_ticker in sorted(dict_statements):
+        statements = dict_statements[company_ticker]
+        if isinstance(statements, Exception):
+            continue
+        rows = _LAYOUT_ROWS[statements.layout]
+        year_positions = np.flatnonzero(statements.present[panel_statements].all(axis = 0))
+        list_values.append(statements.values[np.ix_([rows[field] for field in panel_fields], year_positions)])
+        list_years.append(statements.years[year_positions])
+        list_tickers.append(np.full(len(year_positions), company_ticker, dtype = object))
+
+    if not list_values:
+        list_values = [np.empty((len(panel_fields), 0))]
+        list_years = [np.empty(0, dtype = np.int16)]
+        list_tickers = [np.empty(0, dtype = object)]
+
+    index = pd.MultiIndex.from_arrays(
+        [np.concatenate(list_tickers), np.concatenate(list_years).astype(np.int64)], names = ['ticker', 'calendarYear']
+    )
+    return pd.DataFrame(np.concatenate(list_values, axis = 1).T, index = index, columns = [item for _, item in panel_fields])
@@ -0,0 +1,137 @@
+import pandas as pd
+import numpy as np
+
+# statement code -> (line-items of that statement generated by generate_company_financials())
+SYNTHETIC_LINE_ITEMS = {
+    'IS': [
+        'revenue', 'costOfRevenue', 'grossProfit', 'operatingIncome', 'ebitda', 'depreciationAndAmortization',
+        'interestExpense', 'incomeBeforeTax', 'incomeTaxExpense', 'netIncome', 'eps',
+    ],
+    'BS': [
+        'cashAndCashEquivalents', 'netReceivables', 'inventory', 'propertyPlantEquipmentNet', 'totalAssets',
+        'accountPayables', 'totalDebt', 'totalLiabilities', 'totalStockholdersEquity', 'totalEquity',
+    ],
+    'CF': [
+        'netIncome', 'depreciationAndAmortization', 'operatingCashFlow', 'capitalExpenditure', 'dividendsPaid',
+        'freeCashFlow',
+    ],
+    'SC': ['stockPrice', 'numberOfShares', 'marketCapitalization', 'addTotalDebt', 'minusCashAndCashEquivalents', 'enterpriseValue'],
+}
+
+
+def generate_line_items(n_tickers, n_years, seed = 0):
+    """
+    Draws every line-item of N companies x M years as arrays (oldest year first)
+    Companies get their own growth, margins & balance sheet ratios (similar in size to S&P 500 companies),
+    years add noise around them so the DCF steps see realistic, non-constant histories
+    Returns dict of line-item -> array shaped (n_tickers, n_years)
+    """
+
+    rng = np.random.default_rng(seed)
+    size = (n_tickers, n_years)
+
+    def company(low, high):
+        return rng.uniform(low, high, (n_tickers, 1))
+
+    def noise(scale):
+        return 1 + rng.normal(0, scale, size)
+
+    growth = company(-0.02, 0.10)
+    revenue = company(5e8, 5e10) * np.cumprod(1 + growth + rng.normal(0, 0.05, size), axis = 1)
+
+    items = {'revenue': revenue}
+    items['costOfRevenue'] = revenue * company(0.3, 0.7) * noise(0.03)
+    items['grossProfit'] = revenue - items['costOfRevenue']
+    items['depreciationAndAmortization'] = revenue * company(0.01, 0.04) * noise(0.05)
+    items['operatingIncome'] = revenue * company(0.12, 0.35) * noise(0.1)
+    items['ebitda'] = items['operatingIncome'] + items['depreciationAndAmortization']
+    items['totalDebt'] = revenue * company(0.1, 1.0) * noise(0.05)
+    items['interestExpense'] = items['totalDebt'] * company(0.02, 0.07)
+    items['incomeBeforeTax'] = items['operatingIncome'] - items['interestExpense']
+    items['incomeTaxExpense'] = np.maximum(items['incomeBeforeTax'], 0) * company(0.1, 0.25)
+    items['netIncome'] = items['incomeBeforeTax'] - items['incomeTaxExpense']
+
+    items['cashAndCashEquivalents'] = revenue * company(0.05, 0.3) * noise(0.1)
+    items['netReceivables'] = revenue * company(0.05, 0.2) * noise(0.05)
+    items['inventory'] = revenue * company(0.0, 0.15) * noise(0.05)
+    items['propertyPlantEquipmentNet'] = revenue * company(0.05, 0.3) * noise(0.03)
+    items['accountPayables'] = revenue * company(0.05, 0.2) * noise(0.05)
+    items['totalEquity'] = revenue * company(0.3, 1.5) * noise(0.05)
+    items['totalStockholdersEquity'] = items['totalEquity']
+    items['totalLiabilities'] = items['totalDebt'] + items['accountPayables'] + revenue * company(0.05, 0.3)
+    items['totalAssets'] = items['totalLiabilities'] + items['totalEquity']
+
+    items['operatingCashFlow'] = items['netIncome'] + items['depreciationAndAmortization']
+    items['capitalExpenditure'] = -items['depreciationAndAmortization'] * company(1.0, 1.5)
+    items['freeCashFlow'] = items['operatingCashFlow'] + items['capitalExpenditure']
+    items['dividendsPaid'] = -np.maximum(items['netIncome'], 0) * company(0.0, 0.6)
+
+    items['numberOfShares'] = revenue[:, -1:]/company(20, 200) * noise(0.01)
+    items['eps'] = items['netIncome']/items['numberOfShares']
+    items['stockPrice'] = np.maximum(items['eps'] * company(10, 30) * noise(0.15), 1)
+    items['marketCapitalization'] = items['stockPrice'] * items['numberOfShares']
+    items['addTotalDebt'] = items['totalDebt']
+    items['minusCashAndCashEquivalents'] = items['cashAndCashEquivalents']
+    items['enterpriseValue'] = items['marketCapitalization'] + items['totalDebt'] - items['cashAndCashEquivalents']
+
+    return items
+
+
+def generate_company_financials(n_tickers, n_years, last_year = 2021, seed = 0):
+    """
+    Synthetic financials of N companies x M years in the same schema as pull_company_financials():
+    Income Statement, Balance Sheet, Statement of Cash Flows & Company Market Characteristics indexed by calendarYear
+    (newest first) with date, datetime, symbol & FMP's descriptive string fields
+    Returns dict of ticker -> (df_IS, df_BS, df_CF, df_SC), the layout of pull_many_company_financials()
+    """
+
+    items = generate_line_items(n_tickers, n_years, seed = seed)
+    tickers = np.array([f"SYN{i:05d}" for i in range(n_tickers)])
+
+    # one frame per statement for the whole universe (rows grouped by ticker, newest year first), sliced per ticker
+    calendar_years = np.arange(last_year, last_year - n_years, -1)
+    dates = np.array([f"{year}-12-31" for year in calendar_years])
+    ticker_rows = np.repeat(np.arange(n_tickers), n_years)
+    descriptive = {
+        'date': np.tile(dates, n_tickers),
+        'symbol': tickers[ticker_rows],
+        'reportedCurrency': 'USD',
+        'cik': np.char.zfill(ticker_rows.astype(str), 10),
+        'period': 'FY',
+        'link': np.char.add('https://www.sec.gov/Archives/edgar/data/', ticker_rows.astype(str)),
+        'finalLink': np.char.add(np.char.add('https://www.sec.gov/Archives/edgar/data/', ticker_rows.astype(str)), '/10k.htm'),
+    }
+
+    list_df_statements = []
+    for statement, line_items in SYNTHETIC_LINE_ITEMS.items():
+        columns = {'symbol': descriptive['symbol'], 'date': descriptive['date']} if statement == 'SC' else dict(descriptive)
+        columns.update({item: items[item][:, ::-1].ravel() for item in line_items})
+        df_statement = pd.DataFrame(columns, index = pd.Index(np.tile(calendar_years, n_tickers), name = 'calendarYear'))
+        df_statement['datetime'] = pd.to_datetime(df_statement['date'])
+        list_df_statements.append(df_statement)
+
+    return {
+        company_ticker: tuple(df_statement.iloc[i*n_years:(i + 1)*n_years] for df_statement in list_df_statements)
+        for i, company_ticker in enumerate(tickers.tolist())
+    }
+
+
+def generate_daily_returns(tickers, n_days, index_ticker = 'SPY', end_date = '2021-12-31', seed = 0):
+    """
+    Synthetic daily returns (dates x [index, tickers]) from a one-factor market model:
+    Company Return = Beta * Index Return + idiosyncratic noise, betas between 0.5 & 1.8
+    Returns (returns dataframe, Series of the true beta per ticker)
+    """
+
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end = end_date, periods = n_days)
+    # index drift fixed at ~10%/yr so CAPM market returns are realistic for any sample length
+    index_noise = rng.normal(0, 0.011, n_days)
+    index_returns = index_noise - index_noise.mean() + 0.0004
+    betas = rng.uniform(0.5, 1.8, len(tickers))
+
+    returns = index_returns[:, None] * betas + rng.normal(0, 0.015, (n_days, len(tickers)))
+    df_dailyReturn = pd.DataFrame(returns, index = dates, columns = list(tickers))
+    df_dailyReturn.insert(0, index_ticker, index_returns)
+
+    return df_dailyReturn, pd.Series(betas, index = list(tickers), name = 'beta')
@@ -0,0 +1,93 @@
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+# the dcf modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def fmp_records(endpoint, company_ticker, limit):
+    """
+    Statement records in the shape Financial Modeling Prep returns them (newest first)
+    """
+    list_records = []
+    for i in range(limit):
+        year = 2021 - i
+        record = {'date': f"{year}-09-25", 'symbol': company_ticker, 'revenue': 1e9 * 1.05**-i, 'netIncome': 2e8}
+        if endpoint != 'enterprise-values':
+            record['calendarYear'] = str(year)
+        list_records.append(record)
+    return list_records
+
+
+class StubFMPServer:
+    """
+    Local stand-in for the Financial Modeling Prep API
+    responses - queue of (status, headers) answered before the regular 200 statement records
+    requests - (monotonic time, path) of every request received
+    """
+
+    def __init__(self):
+        self.responses = []
+        self.requests = []
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                with stub._lock:
+                    stub.requests.append((time.monotonic(), url.path))
+                    response = stub.responses.pop(0) if stub.responses else None
+                if response is not None:
+                    status, headers = response
+                    self.send_response(status)
+                    for name, value in headers.items():
+                        self.send_header(name, value)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+
+                endpoint, company_ticker = url.path.strip('/').split('/')[-2:]
+                body = json.dumps(fmp_records(endpoint, company_ticker, int(parse_qs(url.query)['limit'][0]))).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target = self.server.serve_forever, daemon = True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def fmp_stub():
+    stub = StubFMPServer()
+    yield stub
+    stub.close()
+
+
+@pytest.fixture(scope = 'session')
+def synthetic_universe():
+    """
+    Financials of 6 synthetic companies x 10 years & 500 days of daily returns (index SPY)
+    """
+    from dcf_synthetic import generate_company_financials, generate_daily_returns
+
+    dict_company_financials = generate_company_financials(6, 10)
+    df_dailyReturn, betas = generate_daily_returns(list(dict_company_financials), 500)
+    return dict_company_financials, df_dailyReturn
@@ -0,0 +1,74 @@
+import time
+
+import pytest
+import requests
+
+from dcf_fetch import FMPClient
+
+
+def test_get_json_returns_statement_records(fmp_stub):
+    with FMPClient('key', requests_per_minute = None, base_url = fmp_stub.url) as client:
+        records = client.get_json('income-statement', 'AAA', 3)
+
+    assert [record['calendarYear'] for record in records] == ['2021', '2020', '2019']
+
+
+def test_429_waits_for_retry_after(fmp_stub):
+    fmp_stub.responses.append((429, {'Retry-After': '1'}))
+
+    with FMPClient('key', requests_per_minute = None, base_url = fmp_stub.url, backoff = 0.01) as client:
+        records = client.get_json('income-statement', 'AAA', 2)
+
+    assert len(records) == 2
+    (time_429, _), (time_retry, _) = fmp_stub.requests
+    # Retry-After takes precedence over the (much shorter) exponential backoff
+    assert time_retry - time_429 >= 0.95
+
+
+def test_429_pauses_every_request_of_the_client(fmp_stub):
+    fmp_stub.responses.append((429, {'Retry-After': '1'}))
+
+    with FMPClient('key', requests_per_minute = None, base_url = fmp_stub.url, max_workers = 4) as client:
+        future = client.executor.submit(client.get_json, 'income-statement', 'AAA', 1)
+        while not fmp_stub.requests:
+            time.sleep(0.01)
+        time.sleep(0.1)
+        # a request of another ticker sent during the pause waits for it as well
+        client.get_json('balance-sheet-statement', 'BBB', 1)
+        future.result()
+
+    time_429 = fmp_stub.requests[0][0]
+    assert len(fmp_stub.requests) == 3
+    assert all(request_time - time_429 >= 0.95 for request_time, _ in fmp_stub.requests[1:])
+
+
+def test_5xx_retries_with_backoff(fmp_stub):
+    fmp_stub.responses += [(503, {}), (503, {})]
+
+    with FMPClient('key', requests_per_minute = None, base_url = fmp_stub.url, backoff = 0.1) as client:
+        records = client.get_json('income-statement', 'AAA', 1)
+
+    assert len(records) == 1
+    times = [request_time for request_time, _ in fmp_stub.requests]
+    # backoff doubles: 0.1s then 0.2s
+    assert times[1] - times[0] >= 0.09
+    assert times[2] - times[1] >= 0.19
+
+
+def test_gives_up_after_max_retries(fmp_stub):
+    fmp_stub.responses += [(429, {'Retry-After': '0'})] * 3
+
+    with FMPClient('key', requests_per_minute = None, base_url = fmp_stub.url, max_retries = 2) as client:
+        with pytest.raises(requests.HTTPError):
+            client.get_json('income-statement', 'AAA', 1)
+
+    assert len(fmp_stub.requests) == 3
+
+
+def test_fetch_statements_pulls_all_statements(fmp_stub):
+    with FMPClient('key', requests_per_minute = None, base_url = fmp_stub.url) as client:
+        statements = client.fetch_statements('AAA', 4)
+
+    assert set(statements) == {'IS', 'BS', 'CF', 'SC'}
+    assert all(len(df_statement) == 4 for df_statement in statements.values())
+    assert len(fmp_stub.requests) == 4
@@ -0,0 +1,63 @@
+import threading
+import time
+
+from dcf_service import StaticDataSource, ValuationService
+
+
+class SlowDataSource(StaticDataSource):
+    """
+    StaticDataSource taking `delay` seconds per fetch, so concurrent requests overlap
+    """
+
+    def __init__(self, dict_company_financials, df_dailyReturn, delay = 0.2):
+        super().__init__(dict_company_financials, df_dailyReturn)
+        self.delay = delay
+
+    def fetch_company_inputs(self, company_ticker):
+        time.sleep(self.delay)
+        return super().fetch_company_inputs(company_ticker)
+
+
+def test_concurrent_identical_requests_are_coalesced(synthetic_universe):
+    dict_company_financials, df_dailyReturn = synthetic_universe
+    company_ticker = next(iter(dict_company_financials))
+    data_source = SlowDataSource(dict_company_financials, df_dailyReturn)
+    service = ValuationService(data_source = data_source)
+
+    results = [None] * 8
+    def request(i):
+        results[i] = service.valuation(company_ticker)
+
+    threads = [threading.Thread(target = request, args = (i,)) for i in range(len(results))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert data_source.calls == 1
+    assert service.stats()['coalesced'] > 0
+    assert all(result == results[0] for result in results)
+
+
+def test_least_recently_used_tickers_are_evicted(synthetic_universe):
+    dict_company_financials, df_dailyReturn = synthetic_universe
+    first, second, third = list(dict_company_financials)[:3]
+    data_source = StaticDataSource(dict_company_financials, df_dailyReturn)
+    service = ValuationService(data_source = data_source, max_tickers = 2)
+
+    valuation_first = service.valuation(first)
+    service.valuation(second)
+    service.valuation(second)
+    assert data_source.calls == 2
+    assert service.stats()['inputs']['items'] == 2
+
+    # the third ticker evicts the least recently used (first) one
+    service.valuation(third)
+    assert data_source.calls == 3
+    assert service.stats()['inputs']['items'] == 2
+    assert service.stats()['analytics']['items'] == 2
+
+    service.valuation(second)
+    assert data_source.calls == 3
+    assert service.valuation(first) == valuation_first
+    assert data_source.calls == 4
@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+
+from dcf_calcs import (
+    DEFAULT_OUTLOOK_SHIFTS, calculate_free_cash_flows_method_1, calculate_historical_free_cash_flows,
+    calculate_ratio_of_FCF_components_to_revenue, forecast_fcf, outlook_columns
+)
+from dcf_instrumentation import NOOP, use_instrumentation
+from dcf_kernel import record_from_financials, value_records
+from dcf_pipeline import build_config, value_company
+
+
+def forecast_fcf_per_year(growth_rate, df_fcf, list_years_to_forecast, df_fcf_ratios, outlook_shift):
+    """
+    Year by year forecast of one outlook, as forecast_fcf() computed it before forecast_fcf_matrix()
+    Returns (revenue, FCF) lists of the forecast years
+    """
+    ratio = df_fcf_ratios['ratio_to_revenue']
+    revenue_previous = df_fcf.loc[list_years_to_forecast[0] - 1, 'revenue']
+    list_revenue, list_fcf = [], []
+    for _ in list_years_to_forecast:
+        revenue = revenue_previous * (1 + growth_rate + outlook_shift)
+        fcf, change_working_cap, cap_ex = calculate_free_cash_flows_method_1(
+            net_income = ratio['netIncome'] * revenue,
+            depr_amort_current_yr = ratio['depreciationAndAmortization'] * revenue,
+            depr_amort_previous_yr = ratio['depreciationAndAmortization'] * revenue_previous,
+            ppe_current_yr = ratio['propertyPlantEquipmentNet'] * revenue,
+            ppe_previous_yr = ratio['propertyPlantEquipmentNet'] * revenue_previous,
+            inventory_current_yr = ratio['inventory'] * revenue,
+            inventory_previous_yr = ratio['inventory'] * revenue_previous,
+            net_receivables_current_yr = ratio['netReceivables'] * revenue,
+            net_payables_current_yr = ratio['accountPayables'] * revenue,
+            net_receivables_previous_yr = ratio['netReceivables'] * revenue_previous,
+            net_payables_previous_yr = ratio['accountPayables'] * revenue_previous
+        )
+        list_revenue.append(revenue)
+        list_fcf.append(fcf)
+        revenue_previous = revenue
+    return list_revenue, list_fcf
+
+
+@pytest.fixture
+def company_inputs(synthetic_universe):
+    dict_company_financials, df_dailyReturn = synthetic_universe
+    return {
+        company_ticker: (*financials, df_dailyReturn[['SPY', company_ticker]])
+        for company_ticker, financials in dict_company_financials.items()
+    }
+
+
+def test_forecast_fcf_matches_per_year_forecast(company_inputs):
+    for company_ticker, (df_incomeStatement, df_balanceSheet, *_) in company_inputs.items():
+        latest_year = df_incomeStatement.index.max()
+        df_fcf = calculate_historical_free_cash_flows(df_incomeStatement, df_balanceSheet)
+        df_fcf_ratios = calculate_ratio_of_FCF_components_to_revenue(df_fcf, ratio_year_set = latest_year)
+        list_years_to_forecast = list(range(latest_year, latest_year + 6))
+
+        df_forecast = forecast_fcf(0.07, df_fcf, list_years_to_forecast, df_fcf_ratios)
+
+        for outlook, outlook_shift in DEFAULT_OUTLOOK_SHIFTS.items():
+            revenue_column, fcf_column = outlook_columns(outlook)
+            list_revenue, list_fcf = forecast_fcf_per_year(
+                0.07, df_fcf, list_years_to_forecast, df_fcf_ratios, outlook_shift
+            )
+            np.testing.assert_allclose(df_forecast.loc[list_years_to_forecast, revenue_column], list_revenue, rtol = 1e-12)
+            np.testing.assert_allclose(df_forecast.loc[list_years_to_forecast, fcf_column], list_fcf, rtol = 1e-12)
+            assert df_forecast.loc[latest_year - 1, revenue_column] == df_fcf.loc[latest_year - 1, 'revenue']
+
+
+def test_forecast_fcf_does_not_modify_its_input(company_inputs):
+    df_incomeStatement, df_balanceSheet, *_ = next(iter(company_inputs.values()))
+    latest_year = df_incomeStatement.index.max()
+    df_fcf = calculate_historical_free_cash_flows(df_incomeStatement, df_balanceSheet)
+    df_fcf_ratios = calculate_ratio_of_FCF_components_to_revenue(df_fcf, ratio_year_set = latest_year)
+    df_fcf_before = df_fcf.copy()
+
+    forecast_fcf(0.07, df_fcf, list(range(latest_year, latest_year + 6)), df_fcf_ratios)
+
+    assert df_fcf.equals(df_fcf_before)
+
+
+@pytest.mark.parametrize('engine', ['numpy', 'loop'])
+def test_value_records_matches_value_company(company_inputs, engine):
+    config = build_config({})
+    with use_instrumentation(NOOP):
+        records = np.array(
+            [record_from_financials(company_ticker, *inputs, config) for company_ticker, inputs in company_inputs.items()]
+        )
+        valuations = value_records(records, engine = engine)
+
+        for valuation, (company_ticker, inputs) in zip(valuations, company_inputs.items()):
+            df_equity_valuations = value_company(company_ticker, *inputs, config)
+            np.testing.assert_allclose(
+                valuation['estimate_stock_price'],
+                df_equity_valuations['estimate_stock_price'].to_numpy(dtype = float),
+                rtol = 1e-9
+            )
+            np.testing.assert_allclose(valuation['wacc'], df_equity_valuations['wacc'].to_numpy(dtype = float), rtol = 1e-9)